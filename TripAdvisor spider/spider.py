@@ -5,33 +5,85 @@ TripAdvisor景点评论爬虫 - 增强版本
 解决数据库连接、多线程冲突、完整采集等问题
 """
 
-import requests
+import time
+PROCESS_START = time.perf_counter()  # 用于统计冷启动耗时
+
 import json
 import os
-import time
 import random
-import urllib3
 import csv
 import re
-import uuid
 import argparse
+import atexit
 import gc
-import psutil
-import pymysql
+import shutil
+import sys
+import base64
+import zlib
+import hashlib
+import gzip
+import bisect
+from array import array
+from collections import OrderedDict
 from datetime import datetime
 from threading import Lock, RLock
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from itertools import islice
 import queue
+import signal
 import threading
 
-# 禁用SSL警告
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+# requests/urllib3、psutil、pymysql 较重，只在需要的代码路径上按需导入，
+# 使 --show-progress、--create-sample 等命令无需加载它们
 
 # ================================ 配置区 ================================
 API_URL = "https://api.tripadvisor.cn/restapi/soa2/20997/getList"
 OUTPUT_DIR = "attraction_comments"
 PROGRESS_FILE = "progress.json"
+REFRESH_PROGRESS_FILE = "refresh_progress.json"  # --since-last 本轮刷新的进度，整轮完成后删除
 COLLECTION_LOG_FILE = "collection_log.csv"
+OUTPUT_INDEX_DIR = os.path.join(OUTPUT_DIR, "_index")  # 输出索引按分片存放：_index/<分片>.json，locationId -> 输出文件路径/版本/校验和
+OUTPUT_SHARD_COUNT = 1000  # 输出文件按 locationId 分到 000-999 子目录
+COLLECTOR_NAME = os.getenv('COLLECTOR_NAME', '')  # 采集人标识，启动时读取一次
+COMPACT_DIR = "attraction_comments_compact"  # --compact 生成的列式压缩数据集目录
+
+# 景点信息缓存：按 locationId 保存景点名称、城市、评分、评论数与各语言评论数，跨运行复用（可被环境变量覆盖）
+LOCATION_CACHE_FILE = "location_cache.json"
+LOCATION_CACHE_TTL_DAYS = float(os.getenv('LOCATION_CACHE_TTL_DAYS', '7'))  # 超过该天数的缓存视为过期，重新请求
+LOCATION_CACHE_MAX_ENTRIES = int(os.getenv('LOCATION_CACHE_MAX_ENTRIES', '50000'))  # 超出时淘汰最久未更新的景点
+
+# 分页配置：默认每页10条；运行时对第一个评论足够多的景点探测一次更大的页大小
+DEFAULT_PAGE_SIZE = 10
+PROBE_PAGE_SIZE = 50
+MAX_CONSECUTIVE_EMPTY_PAGES = 5
+MAX_EMPTY_PAGES = 10
+MAX_CONSECUTIVE_FAILED_PAGES = 3  # 连续请求失败的页数上限，超过后停止翻页并把剩余页记为缺口
+COVERAGE_WARN_PERCENT = 90
+
+# 输入与调度：按块流式读取CSV，块内排序；线程池中最多保留 线程数×倍数 个在途任务
+SCHEDULE_CHUNK_SIZE = 1000
+SUBMIT_WINDOW_FACTOR = 2
+
+# 采集记录CSV批量写入配置（可被环境变量覆盖）
+# COLLECTION_LOG_DURABILITY: batch 按条数/时间批量落盘；flush 每条记录立即写入文件；fsync 每次写入后再 fsync
+COLLECTION_LOG_BATCH_SIZE = int(os.getenv('COLLECTION_LOG_BATCH_SIZE', '50'))
+COLLECTION_LOG_FLUSH_INTERVAL = float(os.getenv('COLLECTION_LOG_FLUSH_INTERVAL', '5'))
+COLLECTION_LOG_DURABILITY = os.getenv('COLLECTION_LOG_DURABILITY', 'batch').lower()
+
+# 数据库连通性检查的最长秒数：检查在后台与读取输入、首批请求并行进行，超时即停止采集
+DB_CHECK_TIMEOUT = float(os.getenv('DB_CHECK_TIMEOUT', '20'))
+
+# 中断时等待在途任务收尾的最长秒数（可被环境变量覆盖）
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv('SHUTDOWN_DRAIN_TIMEOUT', '20'))
+
+# 内存管控（可被环境变量或 --memory-limit 覆盖）：后台每隔 MEMORY_SAMPLE_INTERVAL 秒采样进程RSS，
+# 超过软上限时暂停接纳新景点，并把正在采集的大景点（内存中超过 SPILL_MIN_COMMENTS 条评论）转存到磁盘；
+# RSS 回落到软上限的 MEMORY_RESUME_RATIO 以下时恢复。软上限设为 0 表示关闭
+MEMORY_SOFT_LIMIT_MB = float(os.getenv('MEMORY_SOFT_LIMIT_MB', '500'))
+MEMORY_RESUME_RATIO = 0.85
+MEMORY_SAMPLE_INTERVAL = float(os.getenv('MEMORY_SAMPLE_INTERVAL', '1'))
+SPILL_MIN_COMMENTS = int(os.getenv('SPILL_MIN_COMMENTS', '500'))
+SPILL_DIR = "spill_buffers"  # 转存评论的临时JSONL文件目录（运行时生成，采集完即删除）
 
 # MySQL数据库配置（可被环境变量覆盖）
 MYSQL_CONFIG = {
@@ -71,12 +123,17 @@ HEADERS = {
 
 # 全局变量
 last_request_time = 0
-processed_urls = set()
+processed_ids = None  # 已处理的 locationId 集合（LocationIdSet），在进度管理模块之后初始化
 success_count = 0
 failed_count = 0
 SKIP_DB_OPERATION = False
 SELECTED_LANGS = None
+SINCE_LAST = False  # 增量模式：只抓取比上次采集更新的评论
 THREAD_COUNT = 15  # 默认15线程
+detected_page_size = None  # 本次运行探测到的可用页大小（None 表示尚未探测）
+
+# 停止信号：Ctrl-C/SIGTERM 时置位，分页循环与所有等待都会检查它
+stop_event = threading.Event()
 
 # 锁 - 使用RLock避免死锁
 file_lock = RLock()
@@ -84,6 +141,9 @@ progress_lock = RLock()
 log_lock = RLock()
 db_lock = RLock()  # 数据库操作锁
 request_lock = RLock()  # 请求频率锁
+page_size_lock = RLock()  # 页大小探测锁
+index_lock = RLock()  # 输出索引锁
+location_cache_lock = RLock()  # 景点信息缓存锁
 
 # User-Agent列表（若设置 TA_USER_AGENT，则优先加入池首位）
 USER_AGENTS = [
@@ -94,9 +154,169 @@ USER_AGENTS = [
     'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36'
 ]
 
+# ================================ 时钟与等待模块 ================================
+class Clock:
+    """统一的时钟与等待入口：所有等待都经过这里，可被停止信号打断，并按原因统计等待耗时
+
+    等待期间会执行通过 defer() 提交的就绪任务（例如保存已采集完的景点），
+    让处在礼貌间隔中的线程顺便完成其他工作。测试或基准可用 FakeClock 替换。
+    """
+
+    poll_interval = 0.1  # 等待期间检查新任务的间隔（秒）
+
+    def __init__(self):
+        self._tasks = queue.Queue()
+        self._local = threading.local()
+        self._stats_lock = Lock()
+        self.wait_seconds = {}  # 原因 -> 累计等待秒数
+        self.tasks_run = 0
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def time(self):
+        return time.time()
+
+    def _block(self, seconds, event=None):
+        """实际阻塞 seconds 秒，event（默认为停止信号）置位时提前返回True"""
+        return (event or stop_event).wait(seconds)
+
+    def defer(self, func, *args, **kwargs):
+        """提交一个任务，由下一个处于等待中的线程（或 run_pending）执行"""
+        self._tasks.put((func, args, kwargs))
+
+    def exclude_current_thread(self):
+        """当前线程的等待不执行其他任务（用于后台检查等专用线程）"""
+        self._local.running_task = True
+
+    def pending_tasks(self):
+        return self._tasks.qsize()
+
+    def _run_one(self):
+        try:
+            func, args, kwargs = self._tasks.get_nowait()
+        except queue.Empty:
+            return False
+        self._local.running_task = True
+        try:
+            func(*args, **kwargs)
+        except Exception as e:
+            print(f"⚠️  后台任务失败: {e}")
+        finally:
+            self._local.running_task = False
+            with self._stats_lock:
+                self.tasks_run += 1
+        return True
+
+    def run_pending(self):
+        """在当前线程执行所有已提交的任务，返回执行数量"""
+        count = 0
+        while self._run_one():
+            count += 1
+        return count
+
+    def sleep(self, seconds, reason='other', run_tasks=True):
+        """等待 seconds 秒，期间执行就绪任务（run_tasks=False 时只等待）；收到停止信号时立即返回True"""
+        started = self.monotonic()
+        deadline = started + max(0, seconds)
+        try:
+            while not stop_event.is_set():
+                remaining = deadline - self.monotonic()
+                if remaining <= 0:
+                    return False
+                # 任务内部的等待不再嵌套执行其他任务
+                if run_tasks and not getattr(self._local, 'running_task', False) and self._run_one():
+                    continue
+                if self._block(min(remaining, self.poll_interval)):
+                    break
+            return True
+        finally:
+            elapsed = self.monotonic() - started
+            with self._stats_lock:
+                self.wait_seconds[reason] = self.wait_seconds.get(reason, 0) + elapsed
+
+    def wait_for(self, event, seconds, reason=None):
+        """等待 event 置位，最多 seconds 秒；不被停止信号打断，也不执行后台任务，返回 event 是否已置位
+
+        reason 为None时不计入等待统计（用于后台线程）。
+        """
+        started = self.monotonic()
+        deadline = started + max(0, seconds)
+        try:
+            while not event.is_set():
+                remaining = deadline - self.monotonic()
+                if remaining <= 0:
+                    break
+                self._block(min(remaining, self.poll_interval), event)
+            return event.is_set()
+        finally:
+            if reason is not None:
+                elapsed = self.monotonic() - started
+                with self._stats_lock:
+                    self.wait_seconds[reason] = self.wait_seconds.get(reason, 0) + elapsed
+
+class FakeClock(Clock):
+    """测试与基准用时钟：等待不真正阻塞，只推进虚拟时间"""
+
+    def __init__(self, start=0.0):
+        super().__init__()
+        self._now = start
+        self._now_lock = Lock()
+
+    def monotonic(self):
+        return self._now
+
+    def time(self):
+        return self._now
+
+    def _block(self, seconds, event=None):
+        with self._now_lock:
+            self._now += seconds
+        return (event or stop_event).is_set()
+
+clock = Clock()
+
+def set_clock(new_clock):
+    """替换全局时钟（例如注入 FakeClock）"""
+    global clock
+    clock = new_clock
+
+def wait_or_stop(seconds, reason='other', run_tasks=True):
+    """可被停止信号打断的等待；收到停止信号时立即返回True
+
+    等待有严格截止时间（例如频率限制预约的请求时间点）时传 run_tasks=False，
+    避免期间执行的后台任务超出截止时间。
+    """
+    return clock.sleep(seconds, reason, run_tasks)
+
+def report_wait_stats():
+    """输出各类等待的累计耗时"""
+    if not clock.wait_seconds:
+        return
+    parts = [f"{reason} {seconds:.0f}秒" for reason, seconds in sorted(clock.wait_seconds.items(), key=lambda item: -item[1])]
+    print(f"⏳ 累计等待: {' | '.join(parts)} | 等待中完成的后台任务: {clock.tasks_run}")
+
 # ================================ 网络请求模块 ================================
+_requests_module = None
+first_request_reported = False
+
+def import_requests():
+    """按需导入 requests，并在首次导入时禁用SSL警告"""
+    global _requests_module
+    if _requests_module is None:
+        import requests
+        import urllib3
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+        _requests_module = requests
+    return _requests_module
+
+def report_cold_start(label):
+    """输出从进程启动到当前时刻的耗时"""
+    print(f"🚀 {label}: 启动后 {time.perf_counter() - PROCESS_START:.2f}秒")
+
 def create_session():
     """创建新的session"""
+    requests = import_requests()
     session = requests.Session()
     session.verify = False
     session.trust_env = False
@@ -116,24 +336,31 @@ def make_request_with_retry(url, json_data, max_retries=5):
     """网络请求函数 - 增强版，改进退避策略"""
     global last_request_time
     
-    # 频率限制
+    # 频率限制：在锁内预约下一个请求时间点，锁外等待；等待期间不执行后台任务，保证按预约时间发出
     with request_lock:
-        current_time = time.time()
-        time_since_last = current_time - last_request_time
+        current_time = clock.time()
         min_interval = random.uniform(1.0, 2.0)
-        if time_since_last < min_interval:
-            sleep_time = min_interval - time_since_last
-            time.sleep(sleep_time)
-        last_request_time = time.time()
+        scheduled_time = max(current_time, last_request_time + min_interval)
+        last_request_time = scheduled_time
+    if wait_or_stop(scheduled_time - current_time, 'rate_limit', run_tasks=False):
+        return None
     
     # 每次创建新的session
     session = create_session()
+    requests = import_requests()
+
+    global first_request_reported
+    if not first_request_reported:
+        first_request_reported = True
+        report_cold_start("首个请求发出")
     
     # 轮换User-Agent
     headers = dict(HEADERS)
     headers['user-agent'] = random.choice(USER_AGENTS)
     
     for attempt in range(max_retries):
+        if stop_event.is_set():
+            return None
         try:
             print(f"📡 发送请求 (尝试 {attempt + 1}/{max_retries})...")
             
@@ -156,7 +383,8 @@ def make_request_with_retry(url, json_data, max_retries=5):
                         # 指数退避策略
                         wait_time = min(30, 2 ** attempt + random.uniform(0, 1))
                         print(f"⏳ 等待 {wait_time:.1f}秒后重试...")
-                        time.sleep(wait_time)
+                        if wait_or_stop(wait_time, 'backoff'):
+                            return None
                         continue
                     else:
                         return None
@@ -164,21 +392,24 @@ def make_request_with_retry(url, json_data, max_retries=5):
                 # 频率限制，使用指数退避
                 wait_time = min(60, 5 * (2 ** attempt) + random.uniform(0, 5))
                 print(f"⚠️  频率限制 ({resp.status_code})，等待 {wait_time:.1f}秒后重试 (尝试 {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'backoff'):
+                    return None
                 headers['user-agent'] = random.choice(USER_AGENTS)
                 continue
             elif resp.status_code >= 500:
                 # 服务器错误，使用指数退避
                 wait_time = min(30, 3 * (2 ** attempt) + random.uniform(0, 3))
                 print(f"⚠️  服务器错误 ({resp.status_code})，等待 {wait_time:.1f}秒后重试 (尝试 {attempt + 1}/{max_retries})")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'backoff'):
+                    return None
                 continue
             else:
                 print(f"⚠️ 状态码: {resp.status_code}")
                 if attempt < max_retries - 1:
                     wait_time = min(20, 2 ** attempt + random.uniform(0, 2))
                     print(f"⏳ 等待 {wait_time:.1f}秒后重试...")
-                    time.sleep(wait_time)
+                    if wait_or_stop(wait_time, 'backoff'):
+                        return None
                     continue
                 else:
                     return None
@@ -189,7 +420,8 @@ def make_request_with_retry(url, json_data, max_retries=5):
                 # 指数退避策略
                 wait_time = min(30, 3 * (2 ** attempt) + random.uniform(0, 3))
                 print(f"⏳ 等待 {wait_time:.1f}秒后重试...")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'backoff'):
+                    return None
                 continue
             else:
                 return None
@@ -200,7 +432,8 @@ def make_request_with_retry(url, json_data, max_retries=5):
                 # 指数退避策略
                 wait_time = min(60, 5 * (2 ** attempt) + random.uniform(0, 5))
                 print(f"⏳ 等待 {wait_time:.1f}秒后重试...")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'backoff'):
+                    return None
                 continue
             else:
                 return None
@@ -210,7 +443,8 @@ def make_request_with_retry(url, json_data, max_retries=5):
             if attempt < max_retries - 1:
                 wait_time = min(15, 2 ** attempt + random.uniform(0, 2))
                 print(f"⏳ 等待 {wait_time:.1f}秒后重试...")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'backoff'):
+                    return None
                 continue
             else:
                 return None
@@ -218,8 +452,117 @@ def make_request_with_retry(url, json_data, max_retries=5):
     return None
 
 # ================================ 数据获取模块 ================================
-def get_available_langs(location_id, url=None):
-    """获取该景点可用的语言列表"""
+def _to_int(value, default=0):
+    """安全地将 reviewCount 等字段转为整数"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def build_reviews_payload(location_id, page_num, page_size, langs=None):
+    """构建评论列表请求体；langs 为空表示全部语言"""
+    return {
+        "frontPage": "USER_REVIEWS",
+        "locationId": int(location_id),
+        "selected": {
+            "airlineIds": [],
+            "airlineSeatIds": [],
+            "langs": list(langs or []),  # 空列表表示全部语言
+            "ratings": [],
+            "seasons": [],
+            "tripTypes": [],
+            "airlineLevel": []
+        },
+        "pageInfo": {"num": page_num, "size": page_size}
+    }
+
+def _submit_time_key(value):
+    """submitTime 排序键：兼容 /Date(毫秒)/、纯数字时间戳与可按字典序比较的日期字符串"""
+    text = str(value or '')
+    match = re.search(r'\d{9,}', text)
+    if match and not re.match(r'^\d{4}-', text):
+        return (0, int(match.group()), '')
+    return (1, 0, text)
+
+def newest_review_marker(comments):
+    """返回评论中最新一条的 {"submitTime", "userReviewId"}，没有评论时返回None"""
+    newest = None
+    for comment in comments:
+        if not comment.get('submitTime'):
+            continue
+        if newest is None or _submit_time_key(comment['submitTime']) > _submit_time_key(newest['submitTime']):
+            newest = comment
+    if not newest:
+        return None
+    return {"submitTime": newest['submitTime'], "userReviewId": newest.get('userReviewId', '')}
+
+def is_before_watermark(comment, since):
+    """评论是否已被上次采集覆盖：即上次的最新评论本身或比它更早的评论"""
+    if since.get('userReviewId') and comment.get('userReviewId') == since['userReviewId']:
+        return True
+    if not comment.get('submitTime') or not since.get('submitTime'):
+        return False
+    return _submit_time_key(comment['submitTime']) < _submit_time_key(since['submitTime'])
+
+def get_page_size():
+    """返回本次运行已探测到的页大小，尚未探测时返回None"""
+    with page_size_lock:
+        return detected_page_size
+
+def record_page_size_probe(requested_size, returned_count, expected_total):
+    """根据一次大页请求的返回条数确定接口实际支持的页大小（每次运行只确定一次）"""
+    global detected_page_size
+    with page_size_lock:
+        if detected_page_size is not None:
+            return detected_page_size
+        if returned_count >= requested_size:
+            size = requested_size
+        elif returned_count > DEFAULT_PAGE_SIZE and returned_count < expected_total:
+            # 接口将页大小截断到了 returned_count
+            size = returned_count
+        elif returned_count == DEFAULT_PAGE_SIZE and returned_count < expected_total:
+            # 接口忽略了页大小参数
+            size = DEFAULT_PAGE_SIZE
+        else:
+            # 评论数不足以判断，留给后续景点探测
+            return None
+        detected_page_size = size
+        print(f"📐 页大小探测完成: 每页 {size} 条 (请求 {requested_size} 条)")
+        return size
+
+def record_page_size_probe_failed(requested_size, reason):
+    """大页请求被拒绝、无法解析或返回空列表时，本次运行固定使用默认页大小，不再探测"""
+    global detected_page_size
+    with page_size_lock:
+        if detected_page_size is None:
+            detected_page_size = DEFAULT_PAGE_SIZE
+            print(f"📐 页大小探测失败 (请求 {requested_size} 条: {reason})，本次运行固定每页 {DEFAULT_PAGE_SIZE} 条")
+        return detected_page_size
+
+def build_location_info(loc):
+    """把接口返回的 locationInfo 整理为景点信息字典"""
+    return {
+        "attractionName": loc.get('name', '未知景点'),
+        "cityName": loc.get('cityName', '未知城市'),
+        "cityId": loc.get('cityId', 0),
+        "address": loc.get('address', '未知地址'),
+        "rating": str(loc.get('rating', 'N/A')),
+        "reviewCount": str(loc.get('reviewCount', '0'))
+    }
+
+def get_available_langs(location_id, url=None, lang_counts=None):
+    """获取该景点可用的语言列表；传入 lang_counts 字典时写入各语言的评论数
+
+    景点信息缓存中有未过期的语言评论数时直接使用缓存，不发请求；请求结果写入缓存。
+    """
+    cached = get_cached_location(location_id)
+    if cached and cached.get("langCounts") is not None:
+        counts = cached["langCounts"]
+        if lang_counts is not None:
+            lang_counts.update(counts)
+        print(f"🗃️  使用缓存的语言列表: {', '.join(f'{key}({count})' for key, count in counts.items())} | URL: {url if url else f'景点ID: {location_id}'}")
+        return [key for key, count in counts.items() if key != 'all' and count > 0], dict(cached["info"])
+
     if url:
         print(f"\n🔍 正在获取语言列表... | URL: {url}")
     else:
@@ -233,6 +576,7 @@ def get_available_langs(location_id, url=None):
     }
     langs = []
     location_info = None
+    counts = {}
     try:
         resp = make_request_with_retry(API_URL, payload)
         if not resp:
@@ -245,22 +589,20 @@ def get_available_langs(location_id, url=None):
             key = agg.get('key')
             count = agg.get('count', 0)
             print(f"  - {key}: {count}条评论")
+            if key:
+                counts[key] = count
             if key and key != 'all' and count > 0:
                 langs.append(key)
+        if lang_counts is not None:
+            lang_counts.update(counts)
         
         # 从任意details中获取locationInfo
         details = data.get('details', []) or []
         if details:
             loc = details[0].get('locationInfo', {})
             if loc:
-                location_info = {
-                    "attractionName": loc.get('name', '未知景点'),
-                    "cityName": loc.get('cityName', '未知城市'),
-                    "cityId": loc.get('cityId', 0),
-                    "address": loc.get('address', '未知地址'),
-                    "rating": str(loc.get('rating', 'N/A')),
-                    "reviewCount": str(loc.get('reviewCount', '0'))
-                }
+                location_info = build_location_info(loc)
+                cache_location_info(location_id, location_info, counts)
                 if url:
                     print(f"🏛️ 景点信息: {location_info['attractionName']}({location_info['cityName']}) | 评分:{location_info['rating']} | 总评论:{location_info['reviewCount']} | URL: {url}")
                 else:
@@ -269,148 +611,298 @@ def get_available_langs(location_id, url=None):
         print(f"⚠️  获取语言列表异常: {e}")
     return langs, location_info
 
-def get_reviews_and_info(location_id, langs=None, max_pages_per_lang=10, url=None):
-    """获取指定地点的评论和景点信息 - 完整采集版"""
-    comments = []
-    location_info = None
+def parse_reviews(reviews_data):
+    """把接口返回的 details 解析为评论记录列表"""
+    page_comments = []
+    for review in reviews_data:
+        try:
+            member_info = review.get('memberInfo', {}) if isinstance(review, dict) else {}
+            page_comments.append({
+                "userReviewId": str(review.get("userReviewId", "")),
+                "username": member_info.get("displayName") or member_info.get("username", "Tripadvisor用户"),
+                "userRating": review.get("rating", 0),
+                "title": review.get("title", ""),
+                "tripTypeString": review.get("tripTypeString", ""),
+                "content": review.get("content", ""),
+                "lang": review.get("lang", ""),
+                "submitTime": review.get("submitTime", ""),
+                "attribution": review.get("attribution", "")
+            })
+        except Exception as e:
+            print(f"⚠️  评论解析错误: {e}")
+            continue
+    return page_comments
 
-    # 解析语言列表
-    languages_to_fetch = []
-    if not langs or (isinstance(langs, list) and len(langs) == 1 and langs[0] == 'all'):
-        # 从"全部评论"页面获取语言列表和景点信息
-        languages_to_fetch, location_info = get_available_langs(location_id, url)
-        if not languages_to_fetch:
-            languages_to_fetch = ['all']
-    else:
-        languages_to_fetch = langs
+def paginate_listing(location_id, langs=None, expected_total=None, location_info=None, url=None,
+                     since=None, page_report=None):
+    """分页采集一个评论列表：langs 为空表示"全部评论"，否则为按语言筛选的列表
 
-    if url:
-        print(f"🔍 获取到语言列表: {languages_to_fetch} | URL: {url}")
-    else:
-        print(f"🔍 获取到语言列表: {languages_to_fetch} | 景点ID: {location_id}")
+    expected_total 为该列表预期的评论数，为None时取 location_info 中的 reviewCount。
+    返回 (comments, location_info)；since 与 page_report 的含义同 get_reviews_and_info。
+    """
+    comments = SpillBuffer(location_id, label=','.join(langs) if langs else 'all')
+    label = f"{','.join(langs)}评论" if langs else "全部评论"
+    print(f"\n🌐 开始采集{label} | URL: {url if url else f'景点ID: {location_id}'}")
 
-    # 重要：始终从"全部评论"开始采集，确保获取所有评论
-    print(f"\n🌐 开始采集全部评论 (all) | URL: {url if url else f'景点ID: {location_id}'}")
-    
     page_num = 1
     total_comments = 0
     empty_pages_count = 0
     consecutive_empty_pages = 0  # 连续空页计数
+    if expected_total is None:
+        expected_total = _to_int(location_info.get('reviewCount')) if location_info else 0
+    page_size = get_page_size()
+    failed_pages = []
+    empty_pages = []
+    consecutive_failed_pages = 0
+    missing_from = None
+    info_refreshed = False
+    count_confirmed = False  # expected_total 是否已由本次响应确认
+    live_lang_counts = None
     
-    # 从"全部评论"页面无限制采集
+    # 分页采集，依据 reviewCount（或该语言的评论数）与页大小判断结束
     while True:
-        # 使用"all"模式，不指定特定语言
-        payload = {
-            "frontPage": "USER_REVIEWS",
-            "locationId": int(location_id),
-            "selected": {
-                "airlineIds": [],
-                "airlineSeatIds": [],
-                "langs": [],  # 空列表表示全部语言
-                "ratings": [],
-                "seasons": [],
-                "tripTypes": [],
-                "airlineLevel": []
-            },
-            "pageInfo": {"num": page_num, "size": 10}
-        }
+        if stop_event.is_set():
+            print(f"⏹️  收到停止信号，已采集 {total_comments} 条评论后中止翻页 | URL: {url if url else f'景点ID: {location_id}'}")
+            break
+
+        # 第一页兼做页大小探测：第1页的偏移与页大小无关，探测结果可直接作为第1页数据
+        probing_size = None
+        if page_num == 1 and page_size is None and expected_total > DEFAULT_PAGE_SIZE:
+            probing_size = PROBE_PAGE_SIZE
+        request_size = probing_size or page_size or DEFAULT_PAGE_SIZE
+
+        payload = build_reviews_payload(location_id, page_num, request_size, langs)
 
         try:
-            response = make_request_with_retry(API_URL, payload)
+            # 探测请求失败时直接回退到默认页大小，不做重试退避
+            response = make_request_with_retry(API_URL, payload, max_retries=1 if probing_size else 5)
             if not response:
-                if url:
-                    print(f"❌ 全部评论第 {page_num} 页请求失败 | URL: {url}")
-                else:
-                    print(f"❌ 全部评论第 {page_num} 页请求失败")
-                break
+                raise RuntimeError("请求失败")
                 
             data = response.json()
-            reviews_data = data.get('details', [])
+            reviews_data = data.get('details', []) or []
+
+            # 探测页为空时可能是接口不接受该页大小：以默认页大小重新请求第1页
+            if probing_size and not reviews_data:
+                page_size = record_page_size_probe_failed(probing_size, "返回空列表")
+                continue
+
+            # 按语言采集时以响应中的 langAggs 刷新该语言的评论数（传入的数量可能来自过期的缓存）
+            if langs and not count_confirmed:
+                live_counts = {agg.get('key'): _to_int(agg.get('count')) for agg in data.get('langAggs', []) or []
+                               if agg.get('key')}
+                if langs[0] in live_counts:
+                    expected_total = live_counts[langs[0]]
+                    live_lang_counts = live_counts
+                    count_confirmed = True
+
+            if probing_size:
+                page_size = record_page_size_probe(probing_size, len(reviews_data), expected_total)
+            current_size = page_size or DEFAULT_PAGE_SIZE
             
             if not reviews_data:
+                # 计数一致（已采满或总数未知，失败页按整页计入）或已超出按总数推算的最后一页时，空页即为结束；
+                # 仅在计数不一致时才继续探测空页
+                accounted = total_comments + len(failed_pages) * current_size
+                last_page = -(-expected_total // current_size) if expected_total else 0
+                if not expected_total or accounted >= expected_total or page_num > last_page:
+                    if url:
+                        print(f"🛑 {label}第 {page_num} 页无数据，采集结束 | URL: {url}")
+                    else:
+                        print(f"🛑 {label}第 {page_num} 页无数据，采集结束")
+                    break
+
                 empty_pages_count += 1
                 consecutive_empty_pages += 1
+                empty_pages.append(page_num)
                 if url:
-                    print(f"📄 全部评论第 {page_num} 页无数据 (连续{consecutive_empty_pages}页) | URL: {url}")
+                    print(f"📄 {label}第 {page_num} 页无数据 (连续{consecutive_empty_pages}页，已采{total_comments}/{expected_total}) | URL: {url}")
                 else:
-                    print(f"📄 全部评论第 {page_num} 页无数据 (连续{consecutive_empty_pages}页)")
+                    print(f"📄 {label}第 {page_num} 页无数据 (连续{consecutive_empty_pages}页，已采{total_comments}/{expected_total})")
                 
                 # 连续5页无数据或总空页超过10页则停止
-                if consecutive_empty_pages >= 5 or empty_pages_count >= 10:
+                if consecutive_empty_pages >= MAX_CONSECUTIVE_EMPTY_PAGES or empty_pages_count >= MAX_EMPTY_PAGES:
                     if url:
-                        print(f"🛑 全部评论连续{consecutive_empty_pages}页无数据，停止采集 | URL: {url}")
+                        print(f"🛑 {label}连续{consecutive_empty_pages}页无数据，停止采集 | URL: {url}")
                     else:
-                        print(f"🛑 全部评论连续{consecutive_empty_pages}页无数据，停止采集")
+                        print(f"🛑 {label}连续{consecutive_empty_pages}页无数据，停止采集")
                     break
                 
                 page_num += 1
-                time.sleep(random.uniform(1, 2))
+                wait_or_stop(random.uniform(1, 2), 'page_pause')
                 continue
 
-            # 初始化location_info
-            if not location_info:
+            # 以第一页返回的景点信息为准（可能来自过期的缓存），并写回缓存
+            if not info_refreshed:
                 first = reviews_data[0]
                 loc_info = first.get('locationInfo') if isinstance(first, dict) else None
                 if loc_info:
-                    location_info = {
-                        "attractionName": loc_info.get('name', '未知景点'),
-                        "cityName": loc_info.get('cityName', '未知城市'),
-                        "cityId": loc_info.get('cityId', 0),
-                        "address": loc_info.get('address', '未知地址'),
-                        "rating": str(loc_info.get('rating', 'N/A')),
-                        "reviewCount": str(loc_info.get('reviewCount', '0'))
-                    }
+                    location_info = build_location_info(loc_info)
+                    info_refreshed = True
+                    cache_location_info(location_id, location_info, live_lang_counts)
+                    if not langs:
+                        expected_total = _to_int(location_info['reviewCount'])
+                        count_confirmed = True
 
             # 解析评论
-            page_comments = []
-            for review in reviews_data:
-                try:
-                    member_info = review.get('memberInfo', {}) if isinstance(review, dict) else {}
-                    page_comments.append({
-                        "userReviewId": str(review.get("userReviewId", "")),
-                        "username": member_info.get("displayName") or member_info.get("username", "Tripadvisor用户"),
-                        "userRating": review.get("rating", 0),
-                        "title": review.get("title", ""),
-                        "tripTypeString": review.get("tripTypeString", ""),
-                        "content": review.get("content", ""),
-                        "lang": review.get("lang", ""),
-                        "submitTime": review.get("submitTime", ""),
-                        "attribution": review.get("attribution", "")
-                    })
-                except Exception as e:
-                    print(f"⚠️  评论解析错误: {e}")
-                    continue
+            page_comments = parse_reviews(reviews_data)
+
+            # 增量模式：过滤掉上次已采集的评论
+            reached_watermark = False
+            if since:
+                fresh_comments = [c for c in page_comments if not is_before_watermark(c, since)]
+                reached_watermark = len(fresh_comments) < len(page_comments)
+                page_comments = fresh_comments
 
             comments.extend(page_comments)
             total_comments += len(page_comments)
+            if memory_governor.should_spill(comments.in_memory()):
+                comments.spill()
             consecutive_empty_pages = 0  # 重置连续空页计数
+            consecutive_failed_pages = 0
             if url:
-                print(f"📄 全部评论第 {page_num} 页: {len(page_comments)}条评论 | URL: {url}")
+                print(f"📄 {label}第 {page_num} 页: {len(page_comments)}条评论 | URL: {url}")
             else:
-                print(f"📄 全部评论第 {page_num} 页: {len(page_comments)}条评论")
+                print(f"📄 {label}第 {page_num} 页: {len(page_comments)}条评论")
+
+            if reached_watermark:
+                print(f"🏁 已到达上次采集位置 ({since.get('submitTime')})，新增 {total_comments} 条评论 | URL: {url if url else f'景点ID: {location_id}'}")
+                break
+
+            # 已达到网站显示的总评论数；总数未经本次响应确认时，只要仍是满页就继续翻页
+            if expected_total and total_comments >= expected_total and (count_confirmed or len(reviews_data) < request_size):
+                print(f"🏁 已采集 {total_comments}/{expected_total} 条，采集结束 | URL: {url if url else f'景点ID: {location_id}'}")
+                break
+
+            # 不满一页即为最后一页
+            if len(reviews_data) < current_size:
+                print(f"🏁 第 {page_num} 页不满 {current_size} 条，采集结束 | URL: {url if url else f'景点ID: {location_id}'}")
+                break
             
             page_num += 1
-            time.sleep(random.uniform(1, 2))
+            wait_or_stop(random.uniform(1, 2), 'page_pause')
             
         except Exception as e:
             if url:
-                print(f"❌ 全部评论第 {page_num} 页处理失败: {e} | URL: {url}")
+                print(f"❌ {label}第 {page_num} 页处理失败: {e} | URL: {url}")
             else:
-                print(f"❌ 全部评论第 {page_num} 页处理失败: {e}")
-            break
+                print(f"❌ {label}第 {page_num} 页处理失败: {e}")
+            if stop_event.is_set():
+                break
+            # 探测请求失败：以默认页大小重新请求第1页，不记为失败页
+            if probing_size:
+                page_size = record_page_size_probe_failed(probing_size, e)
+                continue
+            # 记录失败页并跳过，连续失败过多时停止，剩余页整体记为缺口
+            failed_pages.append(page_num)
+            consecutive_failed_pages += 1
+            if consecutive_failed_pages >= MAX_CONSECUTIVE_FAILED_PAGES:
+                missing_from = page_num + 1
+                print(f"🛑 连续 {consecutive_failed_pages} 页请求失败，停止采集 | URL: {url if url else f'景点ID: {location_id}'}")
+                break
+            page_num += 1
+            wait_or_stop(random.uniform(1, 2), 'page_pause')
+
+    if page_report is not None:
+        final_size = page_size or DEFAULT_PAGE_SIZE
+        if langs:
+            page_report["lang"] = langs[0]
+        page_report["pageSize"] = final_size
+        if langs and expected_total:
+            # 未经确认的数量可能已过期，以实际采到的条数为下限
+            page_report["expectedTotal"] = expected_total if count_confirmed else max(expected_total, total_comments)
+        page_report["failedPages"] = failed_pages
+        page_report["emptyPages"] = empty_pages
+        if missing_from and expected_total:
+            last_page = -(-expected_total // final_size)
+            if last_page >= missing_from:
+                page_report["missingFrom"] = missing_from
+                page_report["lastPage"] = last_page
     
     # 显示采集结果
     if total_comments > 0:
         if url:
-            print(f"  ✅ 全部评论采集完成: {total_comments}条评论 | URL: {url}")
+            print(f"  ✅ {label}采集完成: {total_comments}条评论 | URL: {url}")
+        else:
+            print(f"  ✅ {label}采集完成: {total_comments}条评论 | 景点ID: {location_id}")
+
+    return comments.to_list(), location_info
+
+def get_reviews_and_info(location_id, langs=None, max_pages_per_lang=10, url=None, since=None, page_report=None):
+    """获取指定地点的评论和景点信息 - 完整采集版
+
+    langs 为 None 或 ['all'] 时分页采集"全部评论"；为语言子集时按 langAggs 中各语言的评论数
+    分别分页采集每种语言的筛选列表，多个语言并发进行（共用全局请求频率限制）。
+    since 为上次采集的最新评论标记 {"submitTime", "userReviewId"}；给出时为增量模式，
+    只返回比它更新的评论，遇到已采集过的评论即停止翻页。
+    page_report 为调用方传入的字典，采集结束后写入 pageSize、failedPages、emptyPages，
+    以及因连续失败而未请求的页范围 missingFrom/lastPage，供 --repair 定向补采；
+    按语言采集时各语言的记录放在 page_report["byLang"] 中。
+    """
+    lang_counts = {}
+    if not langs or (isinstance(langs, list) and len(langs) == 1 and langs[0] == 'all'):
+        # 采集全部评论只需要景点信息：缓存未过期时直接开始翻页，不再请求语言列表
+        cached = get_cached_location(location_id)
+        if cached:
+            location_info = dict(cached["info"])
+            print(f"🗃️  使用缓存的景点信息: {location_info['attractionName']}({location_info['cityName']}) | 总评论:{location_info['reviewCount']} | URL: {url if url else f'景点ID: {location_id}'}")
         else:
-            print(f"  ✅ 全部评论采集完成: {total_comments}条评论 | 景点ID: {location_id}")
+            languages_to_fetch, location_info = get_available_langs(location_id, url, lang_counts)
+            if url:
+                print(f"🔍 获取到语言列表: {languages_to_fetch or ['all']} | URL: {url}")
+            else:
+                print(f"🔍 获取到语言列表: {languages_to_fetch or ['all']} | 景点ID: {location_id}")
+        return paginate_listing(location_id, location_info=location_info, url=url, since=since, page_report=page_report)
+
+    cached = get_cached_location(location_id)
+    counts_from_cache = bool(cached and cached.get("langCounts") is not None)
+    languages_to_fetch, location_info = get_available_langs(location_id, url, lang_counts)
+
+    # 按语言采集：只采集该景点实际有评论的语言；语言聚合获取失败或来自缓存时按所选语言全部尝试，
+    # 由各语言第一页响应中的 langAggs 确认或取消（缓存中为0的语言可能已有新评论）
+    if lang_counts and not counts_from_cache:
+        plan = [(lang, lang_counts.get(lang, 0)) for lang in langs if lang_counts.get(lang, 0) > 0]
+    else:
+        plan = [(lang, lang_counts.get(lang, 0)) for lang in langs]
+    source = "（数量来自缓存，由第一页确认）" if counts_from_cache else ""
+    print(f"🗺️  按语言采集计划{source}: {', '.join(f'{lang}({count}条)' for lang, count in plan) or '无'} | URL: {url if url else f'景点ID: {location_id}'}")
+    if not plan:
+        return [], location_info
+
+    reports = {lang: {} for lang, _ in plan}
+    results = {}
+    with ThreadPoolExecutor(max_workers=len(plan)) as executor:
+        futures = {
+            executor.submit(paginate_listing, location_id, [lang], count or None, location_info, url,
+                            since, reports[lang]): lang
+            for lang, count in plan
+        }
+        for future in as_completed(futures):
+            lang = futures[future]
+            try:
+                results[lang] = future.result()
+            except Exception as e:
+                print(f"❌ {lang}评论采集失败: {e}")
+                results[lang] = ([], None)
+
+    comments = []
+    expected = sum(reports[lang].get("expectedTotal") or count for lang, count in plan)
+    if page_report is not None and expected:
+        page_report["expectedTotal"] = expected
+    for lang, _ in plan:
+        lang_comments, lang_info = results[lang]
+        comments.extend(lang_comments)
+        location_info = location_info or lang_info
+    comments = merge_comments(comments, [])
 
+    if page_report is not None:
+        page_report["byLang"] = {lang: report for lang, report in reports.items() if gap_groups(report)}
     return comments, location_info
 
 # ================================ 数据库模块 - 增强版 ================================
 def get_db_connection_with_retry(max_retries=5):
     """获取数据库连接 - 带重试机制"""
+    import pymysql
     for attempt in range(max_retries):
         try:
             print(f"🔗 连接数据库 (尝试 {attempt + 1}/{max_retries})...")
@@ -433,16 +925,17 @@ def get_db_connection_with_retry(max_retries=5):
                 # 指数退避策略
                 wait_time = min(60, 5 * (2 ** attempt) + random.uniform(0, 5))
                 print(f"⏳ {wait_time}秒后重试...")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'db_retry'):
+                    return None
             else:
                 print("❌ 数据库连接最终失败")
                 return None
     
     return None
 
-def test_db_connection():
+def test_db_connection(max_retries=5):
     """测试数据库连接"""
-    connection = get_db_connection_with_retry()
+    connection = get_db_connection_with_retry(max_retries)
     if connection:
         try:
             connection.close()
@@ -451,8 +944,49 @@ def test_db_connection():
             pass
     return False
 
+# 后台数据库检查状态：ok 为 None 表示检查尚未完成
+db_check_state = {"ok": None, "done": threading.Event(), "deadline": 0.0}
+
+def start_db_check(timeout):
+    """在后台线程中检查数据库连通性，不阻塞读取输入与首批请求
+
+    检查失败或超过 timeout 秒仍未完成时置位停止信号，尽快结束本次运行。
+    """
+    db_check_state["deadline"] = clock.monotonic() + timeout
+
+    def finish(ok, message=None):
+        if db_check_state["done"].is_set():
+            return
+        db_check_state["ok"] = ok
+        db_check_state["done"].set()
+        if not ok:
+            print(message)
+            stop_event.set()
+
+    def run():
+        clock.exclude_current_thread()
+        started = clock.monotonic()
+        ok = test_db_connection(max_retries=3)
+        if ok:
+            print(f"✅ 数据库检查通过 ({clock.monotonic() - started:.1f}秒)")
+        finish(ok, "❌ 数据库连接失败，停止采集")
+
+    def watchdog():
+        if not clock.wait_for(db_check_state["done"], timeout):
+            finish(False, f"❌ 数据库检查超过 {timeout:.0f} 秒未完成，停止采集")
+
+    threading.Thread(target=watchdog, name='db-check-watchdog', daemon=True).start()
+    threading.Thread(target=run, name='db-check', daemon=True).start()
+
+def wait_db_ready():
+    """等待后台数据库检查完成，返回是否可用（最多等到检查的截止时间）"""
+    remaining = db_check_state["deadline"] - clock.monotonic()
+    clock.wait_for(db_check_state["done"], remaining, 'db_check')
+    return bool(db_check_state["ok"])
+
 def execute_db_operation_with_retry(operation_func, *args, **kwargs):
     """执行数据库操作的通用函数，每次重新连接，带重试"""
+    import pymysql
     max_retries = 5
     for attempt in range(max_retries):
         connection = None
@@ -462,7 +996,8 @@ def execute_db_operation_with_retry(operation_func, *args, **kwargs):
                 if attempt < max_retries - 1:
                     wait_time = min(30, 3 * (2 ** attempt))
                     print(f"🔄 数据库连接失败，{wait_time}秒后重试...")
-                    time.sleep(wait_time)
+                    if wait_or_stop(wait_time, 'db_retry'):
+                        return False
                     continue
                 else:
                     return False
@@ -476,7 +1011,8 @@ def execute_db_operation_with_retry(operation_func, *args, **kwargs):
             if attempt < max_retries - 1:
                 wait_time = min(30, 3 * (2 ** attempt))
                 print(f"⏳ {wait_time}秒后重试...")
-                time.sleep(wait_time)
+                if wait_or_stop(wait_time, 'db_retry'):
+                    return False
             else:
                 print("❌ 数据库操作最终失败")
                 return False
@@ -499,7 +1035,7 @@ def _insert_record_operation(connection, url, comment_count, json_filename, loca
     insert_data = {
         "采集网站": "TripAdvisor",
         "url": url,
-        "采集人": os.getenv('COLLECTOR_NAME', ''),
+        "采集人": COLLECTOR_NAME,
         "采集时间": current_time,
         "评论数": str(comment_count),
         "存储地址": relative_path
@@ -540,14 +1076,111 @@ def delete_collection_record_from_db(url, location_info):
     return execute_db_operation_with_retry(_delete_record_operation, url, location_info)
 
 # ================================ 进度管理模块 ================================
+PROGRESS_FORMAT_VERSION = 2
+
+class LocationIdSet:
+    """紧凑的 locationId 集合：有序的 array('Q') + 小缓冲集合
+
+    新加入的ID先进入缓冲集合，超过阈值后合并进有序数组；成员检查为
+    缓冲集合查找 + 二分查找，每个ID在数组中只占8字节。非线程安全，
+    调用方需自行加锁（progress_lock）。
+    """
+
+    MERGE_THRESHOLD = 4096
+
+    def __init__(self, ids=()):
+        self._sorted = array('Q')
+        self._recent = set()
+        for location_id in ids:
+            self.add(location_id)
+        self._merge()
+
+    def _merge(self):
+        if not self._recent:
+            return
+        merged = array('Q')
+        i = 0
+        for location_id in sorted(self._recent):
+            j = bisect.bisect_left(self._sorted, location_id, i)
+            merged.extend(self._sorted[i:j])
+            merged.append(location_id)
+            i = j
+        merged.extend(self._sorted[i:])
+        self._sorted = merged
+        self._recent = set()
+
+    def add(self, location_id):
+        location_id = int(location_id)
+        if location_id in self:
+            return
+        self._recent.add(location_id)
+        if len(self._recent) >= self.MERGE_THRESHOLD:
+            self._merge()
+
+    def __contains__(self, location_id):
+        location_id = int(location_id)
+        if location_id in self._recent:
+            return True
+        i = bisect.bisect_left(self._sorted, location_id)
+        return i < len(self._sorted) and self._sorted[i] == location_id
+
+    def __len__(self):
+        return len(self._sorted) + len(self._recent)
+
+    def __iter__(self):
+        self._merge()
+        return iter(self._sorted)
+
+    def to_compact(self):
+        """序列化为 base64(zlib(差分编码的小端 uint64 数组))"""
+        self._merge()
+        deltas = array('Q', self._sorted)
+        for i in range(len(deltas) - 1, 0, -1):
+            deltas[i] -= deltas[i - 1]
+        if sys.byteorder == 'big':
+            deltas.byteswap()
+        return base64.b64encode(zlib.compress(deltas.tobytes())).decode('ascii')
+
+    @classmethod
+    def from_compact(cls, text):
+        deltas = array('Q')
+        deltas.frombytes(zlib.decompress(base64.b64decode(text)))
+        if sys.byteorder == 'big':
+            deltas.byteswap()
+        for i in range(1, len(deltas)):
+            deltas[i] += deltas[i - 1]
+        ids = cls()
+        ids._sorted = deltas
+        return ids
+
+processed_ids = LocationIdSet()
+refreshed_ids = LocationIdSet()  # --since-last 本轮已刷新的 locationId
+refresh_started_at = None
+
+def pass_done_ids():
+    """本次运行据以跳过景点的集合：增量刷新用本轮刷新进度，否则用全量进度（调用方持有 progress_lock）"""
+    return refreshed_ids if SINCE_LAST else processed_ids
+
+def mark_processed(location_id):
+    """记录景点已处理；增量刷新时同时记入本轮刷新进度（调用方持有 progress_lock）"""
+    processed_ids.add(location_id)
+    if SINCE_LAST:
+        refreshed_ids.add(location_id)
+
 def save_progress():
-    """保存处理进度"""
-    progress_data = {
-        "processed_urls": list(processed_urls),
-        "success_count": success_count,
-        "failed_count": failed_count,
-        "timestamp": time.time()
-    }
+    """保存处理进度（同时保存输出索引、景点信息缓存并写出缓冲的采集记录）"""
+    collection_log.flush()
+    save_output_index()
+    save_location_cache()
+    with progress_lock:
+        progress_data = {
+            "version": PROGRESS_FORMAT_VERSION,
+            "processed_count": len(processed_ids),
+            "processed_ids": processed_ids.to_compact(),
+            "success_count": success_count,
+            "failed_count": failed_count,
+            "timestamp": time.time()
+        }
     
     try:
         with file_lock:
@@ -555,10 +1188,56 @@ def save_progress():
                 json.dump(progress_data, f, ensure_ascii=False, indent=2)
     except Exception as e:
         print(f"⚠️  保存进度失败: {e}")
+    if SINCE_LAST:
+        save_refresh_progress()
+
+def save_refresh_progress():
+    """保存 --since-last 本轮刷新进度"""
+    with progress_lock:
+        refresh_data = {
+            "version": PROGRESS_FORMAT_VERSION,
+            "started_at": refresh_started_at,
+            "refreshed_count": len(refreshed_ids),
+            "refreshed_ids": refreshed_ids.to_compact(),
+            "timestamp": time.time()
+        }
+    try:
+        with file_lock:
+            with open(REFRESH_PROGRESS_FILE, 'w', encoding='utf-8') as f:
+                json.dump(refresh_data, f, ensure_ascii=False, indent=2)
+    except Exception as e:
+        print(f"⚠️  保存刷新进度失败: {e}")
+
+def load_refresh_progress():
+    """加载 --since-last 本轮刷新进度；没有时开始新一轮刷新"""
+    global refreshed_ids, refresh_started_at
+    refresh_started_at = time.time()
+    if not os.path.exists(REFRESH_PROGRESS_FILE):
+        print("🔁 开始新一轮增量刷新")
+        return
+    try:
+        with file_lock:
+            with open(REFRESH_PROGRESS_FILE, 'r', encoding='utf-8') as f:
+                refresh_data = json.load(f)
+        with progress_lock:
+            refreshed_ids = LocationIdSet.from_compact(refresh_data.get("refreshed_ids", ""))
+            refresh_started_at = refresh_data.get("started_at") or refresh_started_at
+        started = datetime.fromtimestamp(refresh_started_at).strftime("%Y-%m-%d %H:%M:%S")
+        print(f"🔁 继续本轮增量刷新 (开始于 {started}): 已刷新 {len(refreshed_ids)} 个景点")
+    except Exception as e:
+        print(f"⚠️  加载刷新进度失败: {e}")
+
+def finish_refresh_pass():
+    """整轮增量刷新完成：删除本轮刷新进度，下次 --since-last 重新开始"""
+    try:
+        os.remove(REFRESH_PROGRESS_FILE)
+    except OSError:
+        pass
+    print("🏁 本轮增量刷新已完成，下次 --since-last 将开始新一轮")
 
 def load_progress():
     """加载处理进度"""
-    global processed_urls, success_count, failed_count
+    global processed_ids, success_count, failed_count
     
     if not os.path.exists(PROGRESS_FILE):
         return
@@ -567,12 +1246,26 @@ def load_progress():
         with file_lock:
             with open(PROGRESS_FILE, 'r', encoding='utf-8') as f:
                 progress_data = json.load(f)
-                
-        processed_urls = set(progress_data.get("processed_urls", []))
-        success_count = progress_data.get("success_count", 0)
-        failed_count = progress_data.get("failed_count", 0)
+
+        if progress_data.get("processed_ids"):
+            loaded_ids = LocationIdSet.from_compact(progress_data["processed_ids"])
+        else:
+            loaded_ids = LocationIdSet()
+        # 迁移旧版 progress.json：processed_urls 中的URL转换为 locationId，下次保存时写为新格式
+        legacy_urls = progress_data.get("processed_urls") or []
+        for url in legacy_urls:
+            _, location_id = extract_ids_from_url(url)
+            if location_id:
+                loaded_ids.add(location_id)
+        if legacy_urls:
+            print(f"🔄 已从旧版进度文件迁移 {len(legacy_urls)} 个URL -> {len(loaded_ids)} 个 locationId")
+
+        with progress_lock:
+            processed_ids = loaded_ids
+            success_count = progress_data.get("success_count", 0)
+            failed_count = progress_data.get("failed_count", 0)
         
-        print(f"📁 已加载进度: 已处理 {len(processed_urls)} 个URL, 成功 {success_count}, 失败 {failed_count}")
+        print(f"📁 已加载进度: 已处理 {len(processed_ids)} 个景点, 成功 {success_count}, 失败 {failed_count}")
         
     except Exception as e:
         print(f"⚠️  加载进度失败: {e}")
@@ -589,115 +1282,606 @@ def init_collection_log():
                 ])
         print(f"📝 已创建采集记录文件: {COLLECTION_LOG_FILE}")
 
+class CollectionLogWriter:
+    """长期打开的采集记录CSV写入器：在内存中缓冲记录，按条数、时间或关闭时批量写入
+
+    durability 取值：
+    - batch：缓冲达到 batch_size 条或距上次写入超过 flush_interval 秒时写入
+    - flush：每条记录立即写入文件（不 fsync）
+    - fsync：每条记录立即写入并 fsync
+    """
+
+    def __init__(self, path, batch_size=50, flush_interval=5.0, durability='batch'):
+        self.path = path
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.durability = durability if durability in ('batch', 'flush', 'fsync') else 'batch'
+        self._rows = []
+        self._file = None
+        self._writer = None
+        self._closed = False
+        self._stop = threading.Event()
+        self._flusher = None
+
+    def _ensure_open(self):
+        if self._file is None:
+            self._file = open(self.path, 'a', newline='', encoding='utf-8-sig')
+            self._writer = csv.writer(self._file)
+        if self._flusher is None and self.durability == 'batch' and self.flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_periodically, name='collection-log-flusher', daemon=True)
+            self._flusher.start()
+
+    def _flush_periodically(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def write(self, record):
+        with log_lock:
+            if self._closed:
+                raise RuntimeError("采集记录写入器已关闭")
+            self._ensure_open()
+            self._rows.append(record)
+            if self.durability != 'batch' or len(self._rows) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._rows or self._file is None:
+            return
+        self._writer.writerows(self._rows)
+        self._rows = []
+        self._file.flush()
+        if self.durability == 'fsync':
+            os.fsync(self._file.fileno())
+
+    def flush(self):
+        with log_lock:
+            try:
+                self._flush_locked()
+            except Exception as e:
+                print(f"⚠️  写入采集记录失败: {e}")
+
+    def close(self):
+        """写出剩余记录并关闭文件；可重复调用"""
+        self._stop.set()
+        with log_lock:
+            if self._closed:
+                return
+            self.flush()
+            self._closed = True
+            if self._file is not None:
+                try:
+                    self._file.close()
+                except Exception:
+                    pass
+                self._file = None
+                self._writer = None
+
+collection_log = CollectionLogWriter(COLLECTION_LOG_FILE, COLLECTION_LOG_BATCH_SIZE,
+                                     COLLECTION_LOG_FLUSH_INTERVAL, COLLECTION_LOG_DURABILITY)
+atexit.register(collection_log.close)
+
 def log_collection_record(url, comment_count, json_filename, location_info):
-    """记录采集信息到CSV - 线程安全"""
-    with log_lock:
-        try:
-            current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            relative_path = f"./{OUTPUT_DIR}/{json_filename}"
-            
-            record = [
-                "TripAdvisor",
-                url,
-                os.getenv('COLLECTOR_NAME', ''),
-                current_time,
-                str(comment_count),
-                relative_path
-            ]
+    """记录采集信息到CSV - 线程安全，批量写入"""
+    try:
+        current_time = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        relative_path = f"./{OUTPUT_DIR}/{json_filename}"
+        
+        record = [
+            "TripAdvisor",
+            url,
+            COLLECTOR_NAME,
+            current_time,
+            str(comment_count),
+            relative_path
+        ]
+        collection_log.write(record)
             
-            with open(COLLECTION_LOG_FILE, 'a', newline='', encoding='utf-8-sig') as f:
-                writer = csv.writer(f)
-                writer.writerow(record)
-                
-        except Exception as e:
-            print(f"⚠️  记录采集信息失败: {e}")
+    except Exception as e:
+        print(f"⚠️  记录采集信息失败: {e}")
 
-# ================================ 系统监控模块 ================================
-def get_memory_usage():
-    """获取当前内存使用情况"""
-    try:
-        process = psutil.Process()
-        memory_info = process.memory_info()
-        return memory_info.rss / 1024 / 1024  # MB
-    except:
-        return 0
+# ================================ 输出文件模块 ================================
+OUTPUT_INDEX_VERSION = 1
+VOLATILE_OUTPUT_FIELDS = ("url", "采集时间", "采集人")  # 不参与内容校验和的字段
 
-def log_memory_usage():
-    """记录内存使用情况"""
-    memory_mb = get_memory_usage()
-    if memory_mb > 500:  # 超过500MB时警告
-        print(f"⚠️  内存使用: {memory_mb:.1f}MB")
+output_index = {}  # 分片名 -> {str(locationId) -> {"path", "version", "checksum", "commentCount", "updatedAt"}}
+dirty_index_shards = set()  # 有变更、尚未写盘的索引分片
 
-# ================================ 核心处理模块 ================================
-def extract_ids_from_url(url):
-    """从URL中提取城市ID和地点ID"""
-    match = re.search(r'-g(\d+)-d(\d+)-', url)
-    if match:
-        return match.groups()  # (city_id, location_id)
-    return None, None
+def output_shard(location_id):
+    """locationId 所在的分片名（000-999），输出文件目录与索引分片共用"""
+    return f"{int(location_id) % OUTPUT_SHARD_COUNT:03d}"
+
+def _index_shard(location_id):
+    """返回该 locationId 所在分片的索引字典（调用方持有 index_lock）"""
+    return output_index.setdefault(output_shard(location_id), {})
+
+def _mark_index_dirty(location_id):
+    """标记该 locationId 所在的索引分片需要写盘（调用方持有 index_lock）"""
+    dirty_index_shards.add(output_shard(location_id))
 
 def generate_safe_filename(attraction_name, location_id):
-    """生成安全的文件名 - 与主程序保持一致"""
+    """生成输出文件相对路径（相对 OUTPUT_DIR）：<分片目录>/<景点名>_<locationId>.json
+
+    路径只由 locationId 与景点名决定，重复采集同一景点会覆盖同一文件。
+    """
     # 移除非法字符
     safe_name = re.sub(r'[\\/*?:"<>|\x00-\x1f\x7f-\x9f]', "", attraction_name)
-    safe_name = safe_name.strip()[:100]  # 与主程序保持一致的长度限制
+    safe_name = safe_name.strip()[:100]  # 限制长度
     
     if not safe_name:
         safe_name = f"attraction_{location_id}"
     
-    # 与主程序保持一致的命名格式：景点名_UUID前8位.json
-    random_uuid = uuid.uuid4()
-    filename = f"{safe_name}_{random_uuid.hex[:8]}.json"
-    
-    return filename
+    return f"{output_shard(location_id)}/{safe_name}_{location_id}.json"
+
+def compute_content_checksum(final_data):
+    """计算输出内容的校验和（忽略采集时间等每次都会变化的字段）"""
+    stable = {k: v for k, v in final_data.items() if k not in VOLATILE_OUTPUT_FIELDS}
+    encoded = json.dumps(stable, ensure_ascii=False, sort_keys=True).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+def load_output_index():
+    """加载输出索引：读取 _index/ 下的全部分片"""
+    global output_index
+    if not os.path.isdir(OUTPUT_INDEX_DIR):
+        return
+    loaded = {}
+    try:
+        for entry in os.scandir(OUTPUT_INDEX_DIR):
+            if entry.is_file() and entry.name.endswith('.json'):
+                with open(entry.path, 'r', encoding='utf-8') as f:
+                    loaded[entry.name[:-len('.json')]] = json.load(f).get("entries", {})
+    except Exception as e:
+        print(f"⚠️  加载输出索引失败: {e}")
+        return
+    with index_lock:
+        output_index = loaded
+    print(f"🗂️  已加载输出索引: {sum(len(entries) for entries in loaded.values())} 个景点")
+
+def save_output_index():
+    """保存输出索引：只重写有变更的分片（先写临时文件再替换），序列化时才短暂持有索引锁"""
+    with index_lock:
+        shards = list(dirty_index_shards)
+        dirty_index_shards.clear()
+    if not shards:
+        return
+    os.makedirs(OUTPUT_INDEX_DIR, exist_ok=True)
+    for shard in shards:
+        try:
+            with index_lock:
+                text = json.dumps({"version": OUTPUT_INDEX_VERSION, "entries": output_index.get(shard, {})},
+                                  ensure_ascii=False, separators=(',', ':'))
+            path = os.path.join(OUTPUT_INDEX_DIR, f"{shard}.json")
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(text)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            with index_lock:
+                dirty_index_shards.add(shard)
+            print(f"⚠️  保存输出索引分片 {shard} 失败: {e}")
+
+def iter_index_entries():
+    """遍历全部索引项的快照 [(str(locationId), 索引项)]"""
+    with index_lock:
+        return [(key, dict(entry)) for entries in output_index.values() for key, entry in entries.items()]
+
+def lookup_output(location_id):
+    """按 locationId 查找最新输出文件的索引项，不存在时返回None"""
+    with index_lock:
+        entry = _index_shard(location_id).get(str(location_id))
+        return dict(entry) if entry else None
+
+def load_existing_comments(location_id):
+    """读取索引中该景点最新输出文件里的评论列表，不存在或读取失败时返回None"""
+    entry = lookup_output(location_id)
+    if not entry:
+        return None
+    try:
+        with open(os.path.join(OUTPUT_DIR, entry["path"]), 'r', encoding='utf-8') as f:
+            return json.load(f).get("comments", [])
+    except Exception as e:
+        print(f"⚠️  读取已有输出失败: {entry['path']}: {e}")
+        return None
+
+def merge_comments(new_comments, existing_comments):
+    """合并增量评论：新评论在前，按 userReviewId 去重"""
+    merged = []
+    seen = set()
+    for comment in list(new_comments) + list(existing_comments):
+        review_id = comment.get("userReviewId")
+        if review_id:
+            if review_id in seen:
+                continue
+            seen.add(review_id)
+        merged.append(comment)
+    return merged
+
+def write_attraction_file(location_id, filename, final_data):
+    """写入景点JSON并更新索引；内容未变化且文件存在时跳过重写
+
+    返回 True 表示写入了新内容，False 表示内容未变化。写入失败时抛出异常。
+    """
+    key = str(location_id)
+    checksum = compute_content_checksum(final_data)
+    filepath = os.path.join(OUTPUT_DIR, filename)
+
+    with index_lock:
+        entry = _index_shard(location_id).get(key)
+    if entry and entry.get("checksum") == checksum and entry.get("path") == filename and os.path.exists(filepath):
+        return False
+
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    tmp_path = filepath + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(final_data, f, ensure_ascii=False, indent=4)
+    os.replace(tmp_path, filepath)
+
+    # 景点改名导致路径变化时，删除旧文件
+    if entry and entry.get("path") and entry["path"] != filename:
+        try:
+            os.remove(os.path.join(OUTPUT_DIR, entry["path"]))
+        except OSError:
+            pass
+
+    with index_lock:
+        _index_shard(location_id)[key] = {
+            "path": filename,
+            "version": (entry.get("version", 0) if entry else 0) + 1,
+            "checksum": checksum,
+            "commentCount": len(final_data.get("comments", [])),
+            "updatedAt": final_data.get("采集时间", ""),
+            "newest": newest_review_marker(final_data.get("comments", []))
+        }
+        _mark_index_dirty(location_id)
+    return True
+
+def gap_groups(gaps):
+    """把缺口记录拆成 [(语言, 缺口组)]；"全部评论"列表的语言为None，按语言采集时各语言各一组"""
+    groups = []
+    if gaps.get("failedPages") or gaps.get("emptyPages") or gaps.get("missingFrom"):
+        groups.append((gaps.get("lang"), gaps))
+    for lang, group in (gaps.get("byLang") or {}).items():
+        groups.append((lang, group))
+    return groups
+
+def gap_pages(gaps):
+    """展开一个缺口组中需要补采的页码（升序、去重）"""
+    pages = set(gaps.get("failedPages", [])) | set(gaps.get("emptyPages", []))
+    if gaps.get("missingFrom") and gaps.get("lastPage"):
+        pages.update(range(gaps["missingFrom"], gaps["lastPage"] + 1))
+    return sorted(pages)
+
+def record_coverage_gaps(location_id, page_report, coverage):
+    """把覆盖率与失败/空页写入该景点的输出索引项；没有缺口时清除旧记录，返回写入的缺口"""
+    gaps = None
+    # 已采满时不再保留缺口，避免 --repair 反复请求
+    if page_report and gap_groups(page_report) and (coverage is None or coverage < 100):
+        gaps = {key: value for key, value in page_report.items() if value}
+    with index_lock:
+        entry = _index_shard(location_id).get(str(location_id))
+        if not entry:
+            return None
+        if coverage is not None:
+            entry["coverage"] = round(coverage, 1)
+        if gaps:
+            entry["gaps"] = gaps
+        else:
+            entry.pop("gaps", None)
+        _mark_index_dirty(location_id)
+    return gaps
+
+# ================================ 景点信息缓存模块 ================================
+LOCATION_CACHE_VERSION = 1
+
+location_cache = OrderedDict()  # str(locationId) -> {"info", "langCounts", "cachedAt"}，按更新时间从旧到新排列
+location_cache_dirty = False
+
+def load_location_cache():
+    """加载景点信息缓存"""
+    global location_cache, location_cache_dirty
+    if not os.path.exists(LOCATION_CACHE_FILE):
+        return
+    try:
+        with open(LOCATION_CACHE_FILE, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        entries = sorted(data.get("entries", {}).items(), key=lambda item: item[1].get("cachedAt", 0))
+        with location_cache_lock:
+            location_cache = OrderedDict(entries)
+            location_cache_dirty = False
+        print(f"🗃️  已加载景点信息缓存: {len(location_cache)} 个景点")
+    except Exception as e:
+        print(f"⚠️  加载景点信息缓存失败: {e}")
+
+def save_location_cache():
+    """保存景点信息缓存（有变更时才写入，先写临时文件再替换）"""
+    global location_cache_dirty
+    with location_cache_lock:
+        if not location_cache_dirty:
+            return
+        data = {"version": LOCATION_CACHE_VERSION, "entries": location_cache}
+        try:
+            tmp_path = LOCATION_CACHE_FILE + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            os.replace(tmp_path, LOCATION_CACHE_FILE)
+            location_cache_dirty = False
+        except Exception as e:
+            print(f"⚠️  保存景点信息缓存失败: {e}")
+
+def get_cached_location(location_id, fresh_only=True):
+    """按 locationId 取缓存项 {"info", "langCounts", "cachedAt"}；不存在或已过期（fresh_only 时）返回None"""
+    with location_cache_lock:
+        entry = location_cache.get(str(location_id))
+        if not entry:
+            return None
+        if fresh_only and clock.time() - entry.get("cachedAt", 0) > LOCATION_CACHE_TTL_DAYS * 86400:
+            return None
+        return dict(entry)
+
+def cache_location_info(location_id, location_info, lang_counts=None):
+    """写入景点信息；未给出语言评论数时，只在总评论数未变化时保留原有的语言评论数"""
+    global location_cache_dirty
+    key = str(location_id)
+    with location_cache_lock:
+        previous = location_cache.pop(key, None)
+        if lang_counts is None and previous and previous.get("info", {}).get("reviewCount") == location_info.get("reviewCount"):
+            lang_counts = previous.get("langCounts")
+        entry = {"info": dict(location_info), "cachedAt": clock.time()}
+        if lang_counts:
+            entry["langCounts"] = dict(lang_counts)
+        location_cache[key] = entry
+        while len(location_cache) > LOCATION_CACHE_MAX_ENTRIES:
+            location_cache.popitem(last=False)
+        location_cache_dirty = True
+
+def cached_review_counts():
+    """缓存中各景点的评论数（不论是否过期），作为调度的规模估计"""
+    with location_cache_lock:
+        return {key: _to_int(entry.get("info", {}).get("reviewCount"))
+                for key, entry in location_cache.items()}
+
+# ================================ 系统监控模块 ================================
+def get_memory_usage():
+    """获取当前内存使用情况"""
+    try:
+        import psutil
+        process = psutil.Process()
+        memory_info = process.memory_info()
+        return memory_info.rss / 1024 / 1024  # MB
+    except:
+        return 0
+
+def log_memory_usage():
+    """记录内存使用情况"""
+    memory_mb = get_memory_usage()
+    soft_limit = memory_governor.soft_limit_mb
+    if soft_limit > 0 and memory_mb > soft_limit:  # 超过软上限时警告
+        print(f"⚠️  内存使用: {memory_mb:.1f}MB (软上限 {soft_limit:.0f}MB)")
+
+class MemoryGovernor:
+    """内存管控：后台线程定期采样进程RSS，超过软上限时进入"内存紧张"状态
+
+    紧张期间 admit() 让新景点等待（等待中顺便执行待保存的景点以释放内存），
+    should_spill() 让正在翻页的大景点把评论转存到磁盘；RSS 回落到恢复线以下时解除。
+    没有线程在采集时总是放行，避免常驻内存高于软上限时永远等待。
+    """
+
+    def __init__(self, soft_limit_mb, resume_ratio=MEMORY_RESUME_RATIO, interval=MEMORY_SAMPLE_INTERVAL):
+        self.soft_limit_mb = soft_limit_mb
+        self.resume_ratio = resume_ratio
+        self.interval = interval
+        self.enabled = False
+        self.under_pressure = False
+        self.active = 0  # 正在采集的景点数
+        self.rss_mb = 0.0
+        self.peak_mb = 0.0
+        self.samples = 0
+        self.pressure_episodes = 0
+        self.pressure_seconds = 0.0
+        self.admission_waits = 0
+        self.spills = 0
+        self.spilled_comments = 0
+        self._pressure_since = None
+        self._lock = Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """启动后台采样；软上限为0或 psutil 不可用时不启用"""
+        if self.soft_limit_mb <= 0:
+            print("🧠 内存管控: 已关闭")
+            return False
+        if not get_memory_usage():
+            print("⚠️  psutil 不可用，内存管控未启用")
+            return False
+        shutil.rmtree(SPILL_DIR, ignore_errors=True)  # 上次异常退出留下的转存文件
+        self.enabled = True
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name="memory-governor", daemon=True)
+        self._thread.start()
+        print(f"🧠 内存管控: 软上限 {self.soft_limit_mb:.0f}MB | 恢复线 {self.soft_limit_mb * self.resume_ratio:.0f}MB | 当前 {self.rss_mb:.1f}MB")
+        return True
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._pressure_since is not None:
+                self.pressure_seconds += time.monotonic() - self._pressure_since
+                self._pressure_since = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def sample(self):
+        """采样一次RSS并更新紧张状态"""
+        rss = get_memory_usage()
+        with self._lock:
+            self.rss_mb = rss
+            self.peak_mb = max(self.peak_mb, rss)
+            self.samples += 1
+            if not self.under_pressure and rss > self.soft_limit_mb:
+                self.under_pressure = True
+                self.pressure_episodes += 1
+                self._pressure_since = time.monotonic()
+                print(f"🧠 内存紧张: RSS {rss:.1f}MB > 软上限 {self.soft_limit_mb:.0f}MB，暂停接纳新景点，大景点评论转存磁盘")
+            elif self.under_pressure and rss < self.soft_limit_mb * self.resume_ratio:
+                self.under_pressure = False
+                self.pressure_seconds += time.monotonic() - self._pressure_since
+                self._pressure_since = None
+                print(f"🧠 内存回落: RSS {rss:.1f}MB，恢复接纳新景点")
+        return rss
+
+    def admit(self, url=None):
+        """登记一个开始采集的景点；内存紧张时先等待，收到停止信号返回False"""
+        waited = False
+        while True:
+            with self._lock:
+                if not (self.enabled and self.under_pressure and self.active > 0):
+                    self.active += 1
+                    return True
+                if not waited:
+                    waited = True
+                    self.admission_waits += 1
+                    print(f"⏸️  内存紧张，等待后再开始采集 | URL: {url}")
+            if wait_or_stop(self.interval, 'memory'):
+                return False
+
+    def release(self):
+        with self._lock:
+            self.active = max(0, self.active - 1)
+
+    def should_spill(self, buffered):
+        return self.enabled and self.under_pressure and buffered >= SPILL_MIN_COMMENTS
+
+    def record_spill(self, count):
+        with self._lock:
+            self.spills += 1
+            self.spilled_comments += count
+
+    def report(self):
+        """输出内存管控指标"""
+        if not self.enabled:
+            return
+        print(f"🧠 内存管控: 峰值 {self.peak_mb:.1f}MB / 软上限 {self.soft_limit_mb:.0f}MB | 采样 {self.samples} 次 | "
+              f"紧张 {self.pressure_episodes} 次共 {self.pressure_seconds:.0f}秒 | 延迟开始 {self.admission_waits} 个景点 | "
+              f"转存 {self.spills} 次共 {self.spilled_comments} 条评论")
+
+memory_governor = MemoryGovernor(MEMORY_SOFT_LIMIT_MB)
+
+class SpillBuffer:
+    """单个评论列表的采集缓冲：内存紧张时把已采集的评论追加写入临时JSONL文件，内存中只保留之后的新页"""
+
+    def __init__(self, location_id, label='all'):
+        self.location_id = location_id
+        self.label = label
+        self._items = []
+        self._path = None
+        self._spilled = 0
+
+    def extend(self, comments):
+        self._items.extend(comments)
+
+    def in_memory(self):
+        return len(self._items)
+
+    def __len__(self):
+        return self._spilled + len(self._items)
+
+    def spill(self):
+        """把内存中的评论追加写入转存文件"""
+        if not self._items:
+            return 0
+        if self._path is None:
+            os.makedirs(SPILL_DIR, exist_ok=True)
+            self._path = os.path.join(SPILL_DIR, f"{self.location_id}_{self.label}_{threading.get_ident()}.jsonl")
+        with open(self._path, 'a', encoding='utf-8') as f:
+            for comment in self._items:
+                f.write(json.dumps(comment, ensure_ascii=False) + '\n')
+        count = len(self._items)
+        self._spilled += count
+        self._items = []
+        memory_governor.record_spill(count)
+        return count
+
+    def to_list(self):
+        """读回转存的评论并与内存中的合并为列表（保持采集顺序），删除转存文件"""
+        if self._path is None:
+            return self._items
+        comments = []
+        try:
+            with open(self._path, 'r', encoding='utf-8') as f:
+                comments.extend(json.loads(line) for line in f if line.strip())
+        finally:
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+            self._path = None
+        comments.extend(self._items)
+        self._items = []
+        self._spilled = 0
+        return comments
+
+# ================================ 核心处理模块 ================================
+def extract_ids_from_url(url):
+    """从URL中提取城市ID和地点ID"""
+    match = re.search(r'-g(\d+)-d(\d+)-', url)
+    if match:
+        return match.groups()  # (city_id, location_id)
+    return None, None
+
+def checkpoint_partial_attraction(url, location_id, city_id, location_info, comments):
+    """中断时保存已采集的部分评论，文件标记 partial=true，索引中不记录增量标记；没有评论时不保存"""
+    if not comments:
+        print(f"⏭️  尚未采集到评论，不保存部分结果 | URL: {url}")
+        return
+    partial_data = {
+        "url": url,
+        "locationId": int(location_id),
+        "cityName": location_info['cityName'],
+        "cityId": int(city_id) if city_id else location_info['cityId'],
+        "attractionName": location_info['attractionName'],
+        "address": location_info['address'],
+        "reviewCount": location_info['reviewCount'],
+        "rating": location_info['rating'],
+        "partial": True,
+        "comments": comments,
+        "采集时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+        "采集人": COLLECTOR_NAME
+    }
+    # 已有更完整的输出时不覆盖
+    entry = lookup_output(location_id)
+    if entry and not entry.get("partial") and entry.get("commentCount", 0) >= len(comments):
+        print(f"⏭️  已有更完整的输出，不保存部分结果 | URL: {url}")
+        return
+    filename = generate_safe_filename(location_info['attractionName'], location_id)
+    try:
+        with file_lock:
+            write_attraction_file(location_id, filename, partial_data)
+        with index_lock:
+            entry = _index_shard(location_id).get(str(location_id))
+            if entry:
+                entry["partial"] = True
+                entry["newest"] = None
+                _mark_index_dirty(location_id)
+        print(f"💾 已保存部分结果 ({len(comments)}条): {filename} | URL: {url}")
+    except Exception as e:
+        print(f"⚠️  保存部分结果失败: {e} | URL: {url}")
+
+def persist_attraction(url, location_id, city_id, location_info, comments, page_report=None):
+    """保存一个已采集完的景点：数据库 -> JSON -> CSV，并更新进度与覆盖率分析"""
+    global success_count, failed_count
+
+    # 数据库检查未通过时不保存也不标记为已处理，下次运行重新采集
+    if not SKIP_DB_OPERATION and not wait_db_ready():
+        print(f"⚠️  数据库不可用，放弃保存 | URL: {url}")
+        return
 
-def process_single_attraction(url):
-    """处理单个景点的数据采集 - 线程安全版"""
-    global success_count, failed_count
-    
     try:
-        # 检查是否已处理
-        with progress_lock:
-            if url in processed_urls:
-                print(f"⏭️  跳过已处理的URL: {url}")
-                return True
-        
-        print(f"\n{'='*80}")
-        print(f"🎯 开始处理景点: {url}")
-        print(f"{'='*80}")
-        
-        # 提取ID
-        city_id, location_id = extract_ids_from_url(url)
-        if not location_id:
-            print(f"❌ 无法从URL提取ID: {url}")
-            with progress_lock:
-                processed_urls.add(url)
-                failed_count += 1
-            return False
-        
-        print(f"📍 提取到ID: {location_id} | URL: {url}")
-        
-        # 获取评论和景点信息
-        print(f"🔍 正在获取景点信息... | URL: {url}")
-        comments, location_info = get_reviews_and_info(location_id, langs=SELECTED_LANGS, url=url)
-        
-        # 如果没有获取到景点信息，使用默认值
-        if not location_info:
-            location_info = {
-                "attractionName": f"景点_{location_id}",
-                "cityName": "未知城市",
-                "cityId": int(city_id) if city_id else 0,
-                "address": "未知地址",
-                "rating": "N/A",
-                "reviewCount": str(len(comments))
-            }
-            print(f"⚠️  使用默认景点信息 | URL: {url}")
-        
-        print(f"🏛️ 景点信息: {location_info['attractionName']}({location_info['cityName']}) | 总评论:{len(comments)}条 | URL: {url}")
-        
         # 整合数据
         final_data = {
             "url": url,
+            "locationId": int(location_id),
             "cityName": location_info['cityName'],
             "cityId": int(city_id) if city_id else location_info['cityId'],
             "attractionName": location_info['attractionName'],
@@ -706,19 +1890,11 @@ def process_single_attraction(url):
             "rating": location_info['rating'],
             "comments": comments,
             "采集时间": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "采集人": os.getenv('COLLECTOR_NAME', '')
+            "采集人": COLLECTOR_NAME
         }
         
-        # 保存文件 - 使用景点名称+UUID命名，与主程序保持一致
-        attraction_name = location_info['attractionName']
-        # 更严格的文件名清理，确保安全
-        safe_filename = re.sub(r'[\\/*?:"<>|\x00-\x1f\x7f-\x9f]', "", attraction_name)
-        safe_filename = safe_filename.strip()[:100]  # 限制长度
-        if not safe_filename:
-            safe_filename = f"attraction_{location_id}"
-        random_uuid = uuid.uuid4()
-        filename = f"{safe_filename}_{random_uuid.hex[:8]}.json"
-        filepath = os.path.join(OUTPUT_DIR, filename)
+        # 保存文件 - 按 locationId 分片的确定性路径
+        filename = generate_safe_filename(location_info['attractionName'], location_id)
         
         # 先尝试插入数据库（数据库是权威）
         print(f"💾 正在保存数据... | 景点: {location_info['attractionName']} | URL: {url}")
@@ -734,15 +1910,17 @@ def process_single_attraction(url):
             for save_attempt in range(3):
                 try:
                     with file_lock:
-                        with open(filepath, 'w', encoding='utf-8') as f:
-                            json.dump(final_data, f, ensure_ascii=False, indent=4)
-                    print(f"💾 JSON文件保存成功: {filename} | 景点: {location_info['attractionName']} | URL: {url}")
+                        written = write_attraction_file(location_id, filename, final_data)
+                    if written:
+                        print(f"💾 JSON文件保存成功: {filename} | 景点: {location_info['attractionName']} | URL: {url}")
+                    else:
+                        print(f"⏭️  内容未变化，跳过重写: {filename} | 景点: {location_info['attractionName']} | URL: {url}")
                     save_success = True
                     break
                 except Exception as e:
                     if save_attempt < 2:
                         print(f"⚠️  JSON保存失败，重试 ({save_attempt + 1}/3): {e} | URL: {url}")
-                        time.sleep(1)
+                        wait_or_stop(1, 'save_retry')
                     else:
                         print(f"❌ JSON保存最终失败: {e} | URL: {url}")
             
@@ -770,62 +1948,615 @@ def process_single_attraction(url):
                 failed_count += 1
         
         # 清理内存
+        collected_reviews = len(comments)
         del final_data
         del comments
         gc.collect()
         
         # 更新进度
         with progress_lock:
-            processed_urls.add(url)
+            mark_processed(location_id)
         
-        # 处理完成后间隔
-        # 覆盖率分析
-        if location_info and location_info['reviewCount'] != '0':
-            total_reviews = int(location_info['reviewCount'])
-            collected_reviews = len(comments)
+        # 覆盖率分析（按语言采集时以所选语言的评论数为准）
+        total_reviews = _to_int(location_info['reviewCount']) if location_info else 0
+        if page_report and page_report.get("expectedTotal") is not None:
+            total_reviews = page_report["expectedTotal"]
+        coverage = None
+        if total_reviews:
             coverage = (collected_reviews / total_reviews) * 100
             print(f"\n📊 采集覆盖率分析 | URL: {url}")
             print(f"  📝 网站显示总评论数: {total_reviews}")
             print(f"  📄 实际采集评论数: {collected_reviews}")
             print(f"  📈 采集覆盖率: {coverage:.1f}%")
             
-            if coverage < 90:
+            if coverage < COVERAGE_WARN_PERCENT:
                 print(f"  ⚠️ 覆盖率较低，可能存在遗漏 | URL: {url}")
             else:
                 print(f"  ✅ 覆盖率良好 | URL: {url}")
+
+        # 记录缺口页，供 --repair 定向补采
+        gaps = record_coverage_gaps(location_id, page_report, coverage)
+        if gaps:
+            gap_count = sum(len(gap_pages(group)) for _, group in gap_groups(gaps))
+            print(f"  🕳️  缺口页已记录: 共 {gap_count} 页，可使用 --repair 补采 | URL: {url}")
+
+    except Exception as e:
+        print(f"❌ 保存景点失败 ({url}): {e}")
+        with progress_lock:
+            mark_processed(location_id)
+            failed_count += 1
+        gc.collect()
+
+def process_single_attraction(url):
+    """处理单个景点的数据采集 - 线程安全版"""
+    global success_count, failed_count
+    
+    location_id = None
+    admitted = False
+    try:
+        # 提取ID
+        city_id, location_id = extract_ids_from_url(url)
+        if not location_id:
+            print(f"❌ 无法从URL提取ID: {url}")
+            with progress_lock:
+                failed_count += 1
+            return False
+
+        # 检查是否已处理（以 locationId 判断，不同 slug/域名指向同一景点时只处理一次；增量刷新看本轮刷新进度）
+        with progress_lock:
+            if location_id in pass_done_ids():
+                print(f"⏭️  跳过已处理的景点: {location_id} | URL: {url}")
+                return True
+
+        if stop_event.is_set():
+            return False
+
+        # 内存紧张时等待回落再开始
+        if not memory_governor.admit(url):
+            return False
+        admitted = True
+        
+        print(f"\n{'='*80}")
+        print(f"🎯 开始处理景点: {url}")
+        print(f"{'='*80}")
+        
+        print(f"📍 提取到ID: {location_id} | URL: {url}")
+        
+        # 增量模式：取上次采集的最新评论标记与已有评论
+        since = None
+        existing_comments = None
+        if SINCE_LAST:
+            entry = lookup_output(location_id)
+            since = entry.get("newest") if entry else None
+            if since:
+                existing_comments = load_existing_comments(location_id)
+                if existing_comments is None:
+                    since = None  # 已有输出不可读，退回全量采集
+            if since:
+                print(f"🔁 增量采集: 上次最新评论 {since.get('submitTime')} ({since.get('userReviewId')}) | URL: {url}")
+
+        # 获取评论和景点信息
+        print(f"🔍 正在获取景点信息... | URL: {url}")
+        page_report = {}
+        comments, location_info = get_reviews_and_info(location_id, langs=SELECTED_LANGS, url=url, since=since,
+                                                       page_report=page_report)
+        if existing_comments is not None:
+            new_count = len(comments)
+            comments = merge_comments(comments, existing_comments)
+            del existing_comments
+            print(f"🔁 增量合并: 新增 {new_count} 条，合并后共 {len(comments)} 条 | URL: {url}")
+        
+        # 如果没有获取到景点信息，先用缓存（即使已过期），再使用默认值
+        if not location_info:
+            cached = get_cached_location(location_id, fresh_only=False)
+            if cached:
+                location_info = dict(cached["info"])
+                print(f"🗃️  使用缓存的景点信息 | URL: {url}")
+        if not location_info:
+            location_info = {
+                "attractionName": f"景点_{location_id}",
+                "cityName": "未知城市",
+                "cityId": int(city_id) if city_id else 0,
+                "address": "未知地址",
+                "rating": "N/A",
+                "reviewCount": str(len(comments))
+            }
+            print(f"⚠️  使用默认景点信息 | URL: {url}")
         
-        print(f"🎉 景点处理完成: {location_info['attractionName']} | URL: {url}")
-        time.sleep(random.uniform(2, 4))
+        print(f"🏛️ 景点信息: {location_info['attractionName']}({location_info['cityName']}) | 总评论:{len(comments)}条 | URL: {url}")
+
+        # 采集途中收到停止信号：只保存部分结果（不写数据库/采集记录、不标记为已处理），下次运行重新采集
+        if stop_event.is_set():
+            checkpoint_partial_attraction(url, location_id, city_id, location_info, comments)
+            return False
+        
+        # 保存交给时钟的任务队列：由处在礼貌间隔中的线程（通常就是本线程接下来的间隔）完成
+        clock.defer(persist_attraction, url, location_id, city_id, location_info, comments, page_report)
+        del comments
+
+        print(f"🎉 景点采集完成，已提交保存: {location_info['attractionName']} | URL: {url}")
+        wait_or_stop(random.uniform(2, 4), 'attraction_pause')
         return True
                 
     except Exception as e:
         print(f"❌ 处理景点失败 ({url}): {e}")
         # 即使失败也要记录进度，避免重复处理
         with progress_lock:
-            processed_urls.add(url)
+            if location_id:
+                mark_processed(location_id)
             failed_count += 1
         # 强制垃圾回收
         gc.collect()
         # 短暂等待后继续
-        time.sleep(random.uniform(1, 3))
+        wait_or_stop(random.uniform(1, 3), 'attraction_pause')
         return False
+    finally:
+        if admitted:
+            memory_governor.release()
+
+# ================================ 缺口补采模块 ================================
+def refetch_gap_pages(location_id, lang, group):
+    """重新请求一个缺口组中的页，返回 (新评论, 仍未补上的缺口组或None)"""
+    page_size = group.get("pageSize") or DEFAULT_PAGE_SIZE
+    pages = gap_pages(group)
+    langs = [lang] if lang else []
+    fetched = []
+    still_failed = []
+    still_empty = []
+    for i, page_num in enumerate(pages):
+        if stop_event.is_set():
+            still_failed.extend(pages[i:])
+            break
+        response = make_request_with_retry(API_URL, build_reviews_payload(location_id, page_num, page_size, langs))
+        try:
+            reviews_data = (response.json().get('details', []) or []) if response else None
+        except Exception:
+            reviews_data = None
+        if reviews_data is None:
+            still_failed.append(page_num)
+        elif not reviews_data:
+            still_empty.append(page_num)
+        else:
+            fetched.extend(parse_reviews(reviews_data))
+        wait_or_stop(random.uniform(1, 2), 'page_pause')
+
+    if not still_failed and not still_empty:
+        return fetched, None
+    remaining = {"pageSize": page_size}
+    if lang:
+        remaining["lang"] = lang
+    if still_failed:
+        remaining["failedPages"] = still_failed
+    if still_empty:
+        remaining["emptyPages"] = still_empty
+    return fetched, remaining
+
+def repair_attraction(location_id):
+    """按索引中记录的缺口页重新请求，并按 userReviewId 去重合并进已有输出，返回新增评论数"""
+    entry = lookup_output(location_id)
+    gaps = (entry or {}).get("gaps")
+    if not gaps:
+        return 0
+    filepath = os.path.join(OUTPUT_DIR, entry["path"])
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except Exception as e:
+        print(f"⚠️  读取输出失败，跳过补采: {entry['path']}: {e}")
+        return 0
+
+    groups = gap_groups(gaps)
+    total_pages = sum(len(gap_pages(group)) for _, group in groups)
+    print(f"🩹 补采景点 {location_id}: {total_pages} 页 | 文件: {entry['path']}")
+
+    fetched = []
+    remaining_groups = {}
+    for lang, group in groups:
+        group_comments, remaining = refetch_gap_pages(location_id, lang, group)
+        fetched.extend(group_comments)
+        if remaining:
+            remaining_groups[lang] = remaining
+
+    before = len(data.get("comments", []))
+    data["comments"] = merge_comments(data.get("comments", []), fetched)
+    added = len(data["comments"]) - before
+    with file_lock:
+        write_attraction_file(location_id, entry["path"], data)
+
+    if list(remaining_groups) == [None]:
+        new_gaps = remaining_groups[None]
+    elif remaining_groups:
+        new_gaps = {"byLang": remaining_groups}
+    else:
+        new_gaps = None
+    expected = gaps.get("expectedTotal") or _to_int(data.get("reviewCount"))
+    if expected and len(data["comments"]) >= expected:
+        new_gaps = None  # 已采满，剩余的空页不再补采
+    if new_gaps and gaps.get("expectedTotal"):
+        new_gaps["expectedTotal"] = gaps["expectedTotal"]
+    with index_lock:
+        current = _index_shard(location_id).get(str(location_id))
+        if current:
+            if new_gaps:
+                current["gaps"] = new_gaps
+            else:
+                current.pop("gaps", None)
+            if expected:
+                current["coverage"] = round(len(data["comments"]) / expected * 100, 1)
+            _mark_index_dirty(location_id)
+    remaining_pages = sum(len(gap_pages(group)) for _, group in gap_groups(new_gaps)) if new_gaps else 0
+    print(f"✅ 补采完成 {location_id}: 新增 {added} 条评论，仍缺 {remaining_pages} 页")
+    return added
+
+def repair_all():
+    """对输出索引中所有记录了缺口的景点做定向补采"""
+    targets = [location_id for location_id, entry in iter_index_entries() if entry.get("gaps")]
+    if not targets:
+        print("✅ 没有需要补采的景点")
+        return
+    total_pages = sum(len(gap_pages(group)) for location_id in targets
+                      for _, group in gap_groups(lookup_output(location_id)["gaps"]))
+    print(f"🩹 需要补采 {len(targets)} 个景点，共 {total_pages} 页")
+
+    added = 0
+    executor = ThreadPoolExecutor(max_workers=THREAD_COUNT)
+    futures = [executor.submit(repair_attraction, location_id) for location_id in targets]
+    try:
+        for future in as_completed(futures):
+            try:
+                added += future.result()
+            except Exception as e:
+                print(f"❌ 补采失败: {e}")
+    except KeyboardInterrupt:
+        print("\n⚠️  用户中断补采，正在保存索引...")
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+    executor.shutdown(wait=True)
+    save_output_index()
+    print(f"🎉 补采结束: 新增 {added} 条评论")
+
+# ================================ 调度模块 ================================
+SCHEDULE_ORDERS = ('csv', 'shortest', 'largest')
+
+def load_size_estimates():
+    """从历史采集记录与景点信息缓存中读取各景点的评论数（以 locationId 为键），作为调度的规模估计
+
+    两者都有时以缓存为准（缓存在每次请求景点信息时更新，比采集记录新）。
+    """
+    estimates = {}
+    if not os.path.exists(COLLECTION_LOG_FILE):
+        estimates.update(cached_review_counts())
+        return estimates
+    try:
+        with log_lock:
+            with open(COLLECTION_LOG_FILE, 'r', newline='', encoding='utf-8-sig') as f:
+                for row in csv.DictReader(f):
+                    _, location_id = extract_ids_from_url(row.get('url') or '')
+                    count = _to_int(row.get('评论数'), -1)
+                    if location_id and count >= 0:
+                        estimates[location_id] = count
+    except Exception as e:
+        print(f"⚠️  读取历史评论数失败: {e}")
+    estimates.update(cached_review_counts())
+    return estimates
+
+def probe_review_counts(urls, estimates):
+    """对没有历史记录的景点发一次轻量请求（每页1条）获取 reviewCount"""
+    unknown = []
+    for url in urls:
+        _, location_id = extract_ids_from_url(url)
+        if location_id and location_id not in estimates:
+            unknown.append(location_id)
+    if not unknown:
+        return estimates
+
+    print(f"🔎 探测 {len(unknown)} 个景点的评论数...")
+    # 不用 with：中断时 __exit__ 会等待全部探测完成
+    executor = ThreadPoolExecutor(max_workers=THREAD_COUNT)
+    futures = {executor.submit(get_available_langs, location_id): location_id for location_id in unknown}
+    try:
+        for future in as_completed(futures):
+            try:
+                _, location_info = future.result()
+            except Exception as e:
+                print(f"⚠️  评论数探测失败: {e}")
+                continue
+            if location_info:
+                estimates[futures[future]] = _to_int(location_info.get('reviewCount'))
+    except KeyboardInterrupt:
+        # 置位停止信号让运行中的探测尽快返回，取消未开始的探测，不等待
+        stop_event.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    executor.shutdown(wait=True)
+    return estimates
+
+def order_urls(urls, order, estimates, priorities=None):
+    """按调度策略排序：先按 priority 列降序，再按评论数升序(shortest)或降序(largest)"""
+    priorities = priorities or {}
+    if order == 'csv' and not priorities:
+        return list(urls)
+
+    known = sorted(estimates.values())
+    # 无历史记录的景点按已知规模的中位数估计
+    default_size = known[len(known) // 2] if known else 0
+
+    def size_of(url):
+        _, location_id = extract_ids_from_url(url)
+        return estimates.get(location_id, default_size)
+
+    def sort_key(url):
+        size = size_of(url)
+        if order == 'shortest':
+            size_key = size
+        elif order == 'largest':
+            size_key = -size
+        else:
+            size_key = 0
+        return (-priorities.get(url, 0), size_key)
+
+    # sorted 是稳定排序，相同键保持CSV原顺序
+    return sorted(urls, key=sort_key)
+
+def iter_scheduled_urls(rows, order, estimates, probe_sizes=False):
+    """按块对 (url, priority) 流排序后逐个产出URL；优先级与规模排序只在块内生效"""
+    while True:
+        chunk = list(islice(rows, SCHEDULE_CHUNK_SIZE))
+        if not chunk:
+            return
+        urls = [url for url, _ in chunk]
+        priorities = {url: priority for url, priority in chunk if priority}
+        if probe_sizes and order != 'csv':
+            estimates = probe_review_counts(urls, estimates)
+        for url in order_urls(urls, order, estimates, priorities):
+            yield url
+
+def submit_bounded(executor, func, items, window, in_flight=None):
+    """以有限窗口向线程池提交任务：最多 window 个在途，每完成一个补交一个；逐个产出已完成的 future
+
+    in_flight 为调用方持有的集合，始终包含尚未完成的 future，供中断时取消与等待。
+    """
+    items = iter(items)
+    in_flight = set() if in_flight is None else in_flight
+    in_flight.update(executor.submit(func, item) for item in islice(items, window))
+    while in_flight:
+        done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+        in_flight.difference_update(done)
+        for future in done:
+            if not stop_event.is_set():
+                for item in islice(items, 1):
+                    in_flight.add(executor.submit(func, item))
+            yield future
+
+def drain_executor(executor, in_flight, timeout):
+    """停止调度：置位停止信号、取消未开始的任务，并在 timeout 秒内等待运行中的任务收尾
+
+    返回超时后仍未结束的任务数。
+    """
+    stop_event.set()
+    cancelled = sum(1 for future in in_flight if future.cancel())
+    executor.shutdown(wait=False, cancel_futures=True)
+    running = [future for future in in_flight if not future.cancelled()]
+    print(f"⏹️  已取消 {cancelled} 个未开始的任务，等待 {len(running)} 个运行中的任务收尾 (最多 {timeout:.0f}秒)...")
+    _, not_done = wait(running, timeout=timeout)
+    return len(not_done)
+
+def timed_process_single_attraction(url):
+    """处理单个景点并返回 (结果, 耗时秒数)，用于计算完成时间"""
+    started = clock.monotonic()
+    result = process_single_attraction(url)
+    return result, clock.monotonic() - started
+
+def report_makespan(durations, actual_seconds, workers):
+    """输出实际完成时间与理想完成时间（总工作量/线程数 与 最长单任务 的较大者）的对比"""
+    if not durations:
+        return
+    total_work = sum(durations)
+    longest = max(durations)
+    ideal = max(total_work / max(1, workers), longest)
+    efficiency = (ideal / actual_seconds * 100) if actual_seconds > 0 else 100.0
+    print(f"📐 完成时间: 实际 {actual_seconds:.0f}秒 | 理想 {ideal:.0f}秒 (总工作量 {total_work:.0f}秒 / {workers} 线程, 最长单景点 {longest:.0f}秒) | 调度效率 {efficiency:.1f}%")
+
+# ================================ 语料整理模块 ================================
+COMPACT_FORMAT_VERSION = 3  # 2: locationId 列统一为整数；3: 不计入 partial 文件
+COMPACT_MANIFEST_FILE = os.path.join(COMPACT_DIR, "manifest.json")
+COMPACT_ROOT_SHARD = "_root"  # 旧版平铺在 OUTPUT_DIR 根目录下的文件
+COMPACT_ATTRACTION_COLUMNS = ("locationId", "url", "attractionName", "cityName", "cityId", "address",
+                              "rating", "reviewCount", "采集时间", "采集人")
+COMPACT_REVIEW_COLUMNS = ("locationId", "userReviewId", "username", "userRating", "title", "tripTypeString",
+                          "content", "lang", "submitTime", "attribution")
+
+def scan_output_shards():
+    """扫描输出目录，返回 {分片名: {相对路径: [文件大小, 修改时间ns]}}"""
+    shards = {}
+    if not os.path.isdir(OUTPUT_DIR):
+        return shards
+    for entry in os.scandir(OUTPUT_DIR):
+        if entry.is_dir() and entry.path != OUTPUT_INDEX_DIR:
+            files = {}
+            for sub in os.scandir(entry.path):
+                if sub.is_file() and sub.name.endswith('.json'):
+                    stat = sub.stat()
+                    files[f"{entry.name}/{sub.name}"] = [stat.st_size, stat.st_mtime_ns]
+            if files:
+                shards[entry.name] = files
+        elif entry.is_file() and entry.name.endswith('.json'):
+            stat = entry.stat()
+            shards.setdefault(COMPACT_ROOT_SHARD, {})[entry.name] = [stat.st_size, stat.st_mtime_ns]
+    return shards
+
+def _compact_shard(shard, relpaths):
+    """进程池任务：把一个分片内的景点JSON整理为一个 gzip 压缩的列式分片文件，返回分片统计"""
+    attractions = {col: [] for col in COMPACT_ATTRACTION_COLUMNS}
+    reviews = {col: [] for col in COMPACT_REVIEW_COLUMNS}
+    lang_counts = {}
+    errors = 0
+    partial = 0
+    for relpath in relpaths:
+        try:
+            # 每次只解析一个文件，解析完即释放
+            with open(os.path.join(OUTPUT_DIR, relpath), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception:
+            errors += 1
+            continue
+        # 中断时保存的部分结果不计入数据集，下次完整采集后再整理
+        if data.get("partial"):
+            partial += 1
+            continue
+        location_id = data.get("locationId")
+        if location_id is None:
+            _, location_id = extract_ids_from_url(data.get("url", ""))
+        # 旧版文件从URL提取到的是字符串，统一为整数，保证列内类型一致
+        location_id = _to_int(location_id, None)
+        for col in COMPACT_ATTRACTION_COLUMNS:
+            attractions[col].append(location_id if col == "locationId" else data.get(col))
+        for comment in data.get("comments", []) or []:
+            for col in COMPACT_REVIEW_COLUMNS:
+                reviews[col].append(location_id if col == "locationId" else comment.get(col))
+            lang = comment.get("lang") or "unknown"
+            lang_counts[lang] = lang_counts.get(lang, 0) + 1
+        del data
+
+    part_name = f"part-{shard}.json.gz"
+    part_path = os.path.join(COMPACT_DIR, part_name)
+    tmp_path = part_path + ".tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump({"version": COMPACT_FORMAT_VERSION, "shard": shard,
+                   "attractions": attractions, "reviews": reviews}, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, part_path)
+    return {
+        "part": part_name,
+        "attractions": len(attractions["locationId"]),
+        "reviews": len(reviews["locationId"]),
+        "langs": lang_counts,
+        "errors": errors,
+        "partial": partial
+    }
+
+def load_compact_manifest():
+    """加载列式数据集清单，不存在或版本不符时返回空清单"""
+    try:
+        with open(COMPACT_MANIFEST_FILE, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get("version") == COMPACT_FORMAT_VERSION:
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return {"version": COMPACT_FORMAT_VERSION, "shards": {}}
+
+def compact_corpus(workers=None):
+    """用进程池把 OUTPUT_DIR 整理为 COMPACT_DIR 下的列式压缩分片；只重建文件有变化的分片"""
+    os.makedirs(COMPACT_DIR, exist_ok=True)
+    manifest = load_compact_manifest()
+    old_shards = manifest["shards"]
+    current = scan_output_shards()
+
+    changed = [shard for shard, files in current.items()
+               if old_shards.get(shard, {}).get("files") != files]
+    removed = [shard for shard in old_shards if shard not in current]
+    print(f"🗜️  语料分片: {len(current)} 个 | 需要重建 {len(changed)} 个 | 已删除 {len(removed)} 个")
+
+    for shard in removed:
+        try:
+            os.remove(os.path.join(COMPACT_DIR, old_shards[shard]["part"]))
+        except (OSError, KeyError):
+            pass
+        del old_shards[shard]
+
+    started = time.time()
+    if changed:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_compact_shard, shard, sorted(current[shard])): shard for shard in changed}
+            for i, future in enumerate(as_completed(futures), 1):
+                shard = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"⚠️  分片整理失败: {shard}: {e}")
+                    continue
+                result["files"] = current[shard]
+                old_shards[shard] = result
+                if i % 50 == 0 or i == len(changed):
+                    print(f"📈 整理进度: {i}/{len(changed)}")
+
+    tmp_path = COMPACT_MANIFEST_FILE + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp_path, COMPACT_MANIFEST_FILE)
+    print(f"✅ 整理完成，耗时 {time.time() - started:.1f}秒 | 输出目录: {COMPACT_DIR}/")
+    return manifest
+
+def print_corpus_stats(manifest):
+    """根据清单中的分片统计汇总输出语料统计（无需重新解析JSON）"""
+    shards = manifest.get("shards", {})
+    total_attractions = sum(info.get("attractions", 0) for info in shards.values())
+    total_reviews = sum(info.get("reviews", 0) for info in shards.values())
+    total_errors = sum(info.get("errors", 0) for info in shards.values())
+    total_partial = sum(info.get("partial", 0) for info in shards.values())
+    lang_counts = {}
+    for info in shards.values():
+        for lang, count in info.get("langs", {}).items():
+            lang_counts[lang] = lang_counts.get(lang, 0) + count
+
+    print(f"📊 语料统计:")
+    print(f"   - 景点文件: {total_attractions}")
+    print(f"   - 评论总数: {total_reviews}")
+    if total_errors:
+        print(f"   - 解析失败文件: {total_errors}")
+    if total_partial:
+        print(f"   - 未计入的部分结果文件: {total_partial}")
+    print(f"   - 各语言评论数:")
+    for lang, count in sorted(lang_counts.items(), key=lambda item: -item[1]):
+        print(f"     {lang}: {count}")
 
 # ================================ 主程序 ================================
-def read_urls_from_csv(csv_path):
-    """从CSV文件读取URL列表"""
-    urls = []
-    if not os.path.exists(csv_path):
-        print(f"❌ CSV文件不存在: {csv_path}")
-        return urls
-        
+def iter_urls_from_csv(csv_path, stats):
+    """流式读取CSV：逐行校验URL并按 locationId 去重，产出 (url, priority)
+
+    priority 来自可选的 priority 列，数值越大越先处理。stats 会被实时更新，
+    读完整个文件后 stats['exhausted'] 为 True。
+    """
+    seen_ids = LocationIdSet()
     with open(csv_path, 'r', encoding='utf-8-sig') as f:
         reader = csv.DictReader(f)
         for row in reader:
-            if row.get('url'):
-                urls.append(row['url'].strip())
-    
-    print(f"📖 从CSV读取到 {len(urls)} 条URL")
-    return urls
+            url = (row.get('url') or '').strip()
+            if not url:
+                continue
+            stats['rows'] += 1
+
+            _, location_id = extract_ids_from_url(url)
+            if not location_id:
+                stats['invalid'] += 1
+                print(f"⚠️  无法从URL提取ID，已跳过: {url}")
+                continue
+            if location_id in seen_ids:
+                stats['duplicates'] += 1
+                continue
+            seen_ids.add(location_id)
+
+            priority = 0
+            raw_priority = (row.get('priority') or '').strip()
+            if raw_priority:
+                try:
+                    priority = float(raw_priority)
+                except ValueError:
+                    print(f"⚠️  无效的 priority 值: {raw_priority} | URL: {url}")
+            yield url, priority
+    stats['exhausted'] = True
+
+def iter_pending_urls(csv_path, stats):
+    """在 iter_urls_from_csv 基础上过滤已处理的景点（按 locationId；增量刷新时过滤本轮已刷新的景点）"""
+    for url, priority in iter_urls_from_csv(csv_path, stats):
+        _, location_id = extract_ids_from_url(url)
+        with progress_lock:
+            done = location_id in pass_done_ids()
+        if done:
+            stats['processed'] += 1
+            continue
+        stats['pending'] += 1
+        yield url, priority
 
 def create_sample_csv():
     """创建示例CSV文件"""
@@ -845,7 +2576,7 @@ def create_sample_csv():
 
 def main():
     """主程序入口 - 增强版"""
-    global success_count, failed_count, processed_urls, SELECTED_LANGS, SKIP_DB_OPERATION, THREAD_COUNT
+    global success_count, failed_count, processed_ids, SELECTED_LANGS, SKIP_DB_OPERATION, THREAD_COUNT, SINCE_LAST
     
     # 合规与使用限制提示横幅
     print("\n" + "="*80)
@@ -866,10 +2597,21 @@ def main():
     parser.add_argument('--langs', default='all', help='语言列表，例如 zhCN,en,fr；默认 all 表示全部语言')
     parser.add_argument('--limit', type=int, default=None, help='仅处理前N个URL，用于测试')
     parser.add_argument('--no-db', action='store_true', help='跳过数据库操作，仅保存JSON和CSV')
+    parser.add_argument('--order', choices=SCHEDULE_ORDERS, default='csv',
+                        help='调度顺序：csv 按文件顺序；shortest 评论少的先处理；largest 评论多的先处理（缩短总耗时）')
+    parser.add_argument('--since-last', action='store_true', help='增量模式：只抓取比上次采集更新的评论并合并进已有输出文件')
+    parser.add_argument('--repair', action='store_true', help='只重新请求输出索引中记录的缺口页（失败/空页），合并进已有输出后退出')
+    parser.add_argument('--probe-sizes', action='store_true', help='对没有历史评论数的景点先发轻量请求获取评论数，用于调度排序')
+    parser.add_argument('--compact', action='store_true', help=f'将 {OUTPUT_DIR}/ 整理为列式压缩数据集（{COMPACT_DIR}/）并退出，只处理有变化的分片')
+    parser.add_argument('--stats', action='store_true', help='整理语料并输出评论数、语言分布等统计后退出')
+    parser.add_argument('--workers', type=int, default=None, help='--compact/--stats 使用的进程数，默认CPU核数')
+    parser.add_argument('--memory-limit', type=float, default=None,
+                        help=f'内存软上限(MB)，超过后暂停接纳新景点并把大景点评论转存磁盘；0 表示关闭，默认 {MEMORY_SOFT_LIMIT_MB:.0f}')
     args = parser.parse_args()
 
     # 设置线程数
     THREAD_COUNT = args.threads
+    SINCE_LAST = args.since_last
 
     # 语言设置
     if args.langs.strip().lower() == 'all':
@@ -884,18 +2626,20 @@ def main():
         if os.path.exists(PROGRESS_FILE):
             load_progress()
             print(f"📊 当前进度:")
-            print(f"   - 已处理: {len(processed_urls)} 个URL")
+            print(f"   - 已处理: {len(processed_ids)} 个景点")
             print(f"   - 成功: {success_count}")
             print(f"   - 失败: {failed_count}")
         else:
             print("📊 尚未开始处理")
+        report_cold_start("命令完成")
         return
 
     # 重置进度
     if args.reset_progress:
-        if os.path.exists(PROGRESS_FILE):
-            os.remove(PROGRESS_FILE)
-            print("🔄 进度已重置")
+        for path in (PROGRESS_FILE, REFRESH_PROGRESS_FILE):
+            if os.path.exists(path):
+                os.remove(path)
+                print(f"🔄 进度已重置: {path}")
         return
 
     # 创建示例文件
@@ -903,105 +2647,165 @@ def main():
         create_sample_csv()
         return
 
-    # 创建输出目录
+    # 语料整理与统计
+    if args.compact or args.stats:
+        manifest = compact_corpus(args.workers)
+        if args.stats:
+            print_corpus_stats(manifest)
+        return
+
+    # 创建输出目录并加载输出索引
     os.makedirs(OUTPUT_DIR, exist_ok=True)
+    load_output_index()
+    load_location_cache()
+
+    # 缺口补采
+    if args.repair:
+        repair_all()
+        return
     
     # 数据库设置
     if args.no_db:
         print("⚠️  跳过数据库操作模式")
         SKIP_DB_OPERATION = True
     else:
-        print("🔗 测试数据库连接...")
-        if not test_db_connection():
-            print("❌ 数据库连接失败，程序退出")
-            return
+        print(f"🔗 后台检查数据库连接 (最长 {DB_CHECK_TIMEOUT:.0f}秒)...")
         SKIP_DB_OPERATION = False
+        start_db_check(DB_CHECK_TIMEOUT)
     
     # 初始化采集记录文件
     init_collection_log()
 
     # 加载进度
     load_progress()
+    if SINCE_LAST:
+        load_refresh_progress()
 
-    # 读取URL
-    all_urls = read_urls_from_csv(args.csv)
-    if not all_urls:
-        print("❌ CSV中没有URL，可以使用 --create-sample 创建示例文件")
-        return
-
-    # 过滤已处理的URL
-    pending_urls = [url for url in all_urls if url not in processed_urls]
- 
-    if not pending_urls:
-        print("✅ 所有URL都已处理完成！")
-        print(f"📊 最终统计: 成功 {success_count}, 失败 {failed_count}")
+    # 流式读取URL：逐行校验、按 locationId 去重并过滤已处理项
+    if not os.path.exists(args.csv):
+        print(f"❌ CSV文件不存在: {args.csv}")
         return
+    stream_stats = {"rows": 0, "invalid": 0, "duplicates": 0, "processed": 0, "pending": 0, "exhausted": False}
+    pending_rows = iter_pending_urls(args.csv, stream_stats)
 
     # 测试模式
     if args.test:
-        pending_urls = pending_urls[:3]
-        print(f"🧪 测试模式：处理前 {len(pending_urls)} 个未处理的URL")
+        pending_rows = islice(pending_rows, 3)
+        print(f"🧪 测试模式：处理前 3 个未处理的URL")
 
     # 限制数量
     if args.limit is not None and args.limit > 0:
-        pending_urls = pending_urls[:args.limit]
-        print(f"🔬 本次仅处理前 {len(pending_urls)} 个URL")
+        pending_rows = islice(pending_rows, args.limit)
+        print(f"🔬 本次仅处理前 {args.limit} 个URL")
 
-    print(f"📋 总URL数: {len(all_urls)}")
-    print(f"✅ 已处理: {len(processed_urls)}")
-    print(f"⏳ 待处理: {len(pending_urls)}")
-    print(f"🔧 多线程模式: {THREAD_COUNT} 线程")
+    # 调度排序（按块进行，块大小 SCHEDULE_CHUNK_SIZE）
+    estimates = load_size_estimates() if args.order != 'csv' else {}
+    pending_urls = iter_scheduled_urls(pending_rows, args.order, estimates, args.probe_sizes)
+    print(f"🗂️  调度顺序: {args.order} | 已知规模 {len(estimates)} 个")
 
-    if len(pending_urls) == 0:
-        print("🎉 没有待处理的URL！")
-        return
+    window = max(1, THREAD_COUNT * SUBMIT_WINDOW_FACTOR)
+    if args.memory_limit is not None:
+        memory_governor.soft_limit_mb = args.memory_limit
+    memory_governor.start()
+    report_cold_start("准备就绪，开始调度")
+    print(f"✅ 已处理: {len(processed_ids)}")
+    print(f"🔧 多线程模式: {THREAD_COUNT} 线程 | 在途任务上限: {window}")
 
     # 多线程处理
     start_time = time.time()
+    durations = []
+    completed = 0
     
+    # SIGTERM（例如滚动部署）与 Ctrl-C 同样处理
     try:
-        with ThreadPoolExecutor(max_workers=THREAD_COUNT) as executor:
-            futures = [executor.submit(process_single_attraction, url) for url in pending_urls]
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+    except (ValueError, AttributeError):
+        pass
+
+    executor = ThreadPoolExecutor(max_workers=THREAD_COUNT)
+    in_flight = set()
+    try:
+        for future in submit_bounded(executor, timed_process_single_attraction, pending_urls, window, in_flight):
+            if future.cancelled():
+                continue
+            completed += 1
+            try:
+                _, elapsed = future.result()
+                durations.append(elapsed)
+            except Exception as e:
+                print(f"❌ 任务失败: {e}")
             
-            for i, future in enumerate(as_completed(futures)):
-                try:
-                    future.result()
-                except Exception as e:
-                    print(f"❌ 任务失败: {e}")
-                
-                # 每处理5个保存一次进度
-                if (i + 1) % 5 == 0:
-                    save_progress()
-                    print(f"📈 批量进度: {i+1}/{len(pending_urls)} ({(i+1)/len(pending_urls)*100:.1f}%)")
-                    log_memory_usage()
+            # 每处理5个保存一次进度
+            if completed % 5 == 0:
+                save_progress()
+                print(f"📈 批量进度: 已完成 {completed} | 已读取 {stream_stats['rows']} 行")
+                log_memory_usage()
+        executor.shutdown(wait=True)
+        clock.run_pending()
 
     except KeyboardInterrupt:
-        print("\n⚠️  用户中断程序，正在保存进度...")
+        print("\n⚠️  用户中断程序，正在停止并保存进度...")
+        unfinished = drain_executor(executor, in_flight, SHUTDOWN_DRAIN_TIMEOUT)
+        clock.run_pending()  # 保存已采集完但尚未落盘的景点
         save_progress()
+        collection_log.close()
+        memory_governor.stop()
+        memory_governor.report()
         print("💾 进度已保存，下次运行将从中断处继续")
+        if unfinished:
+            # 仍有请求阻塞在网络IO中，不再等待，直接退出
+            print(f"⚠️  {unfinished} 个任务未在 {SHUTDOWN_DRAIN_TIMEOUT:.0f} 秒内结束，强制退出")
+            sys.stdout.flush()
+            os._exit(130)
+        return
+
+    if not SKIP_DB_OPERATION and db_check_state["done"].is_set() and not db_check_state["ok"]:
+        print("❌ 数据库不可用，本次运行已提前停止；已采集但未保存的景点下次运行将重新采集")
+        save_progress()
+        collection_log.close()
+        memory_governor.stop()
+        memory_governor.report()
+        return
+
+    print(f"📖 CSV统计: 读取 {stream_stats['rows']} 条URL | 无效 {stream_stats['invalid']} | 重复 {stream_stats['duplicates']} | 已处理跳过 {stream_stats['processed']}")
+
+    if stream_stats['rows'] == 0:
+        print("❌ CSV中没有URL，可以使用 --create-sample 创建示例文件")
+        return
+
+    memory_governor.stop()
+    if completed == 0:
+        print("✅ 所有URL都已处理完成！")
+        print(f"📊 最终统计: 成功 {success_count}, 失败 {failed_count}")
+        if SINCE_LAST and stream_stats['exhausted']:
+            finish_refresh_pass()
         return
 
     # 最终保存进度
     save_progress()
+    collection_log.close()
 
     # 统计结果
     duration = int(time.time() - start_time)
-    total_processed = len(processed_urls)
     
     print(f"\n🎉 本轮任务完成！")
-    print(f"📊 本轮处理: {len(pending_urls)} 个景点")
-    print(f"📊 总处理数: {total_processed}/{len(all_urls)} ({(total_processed/len(all_urls)*100):.1f}%)")
+    print(f"📊 本轮处理: {completed} 个景点")
+    print(f"📊 总处理数: {len(processed_ids)}")
     print(f"✅ 累计成功: {success_count}")
     print(f"❌ 累计失败: {failed_count}")
     print(f"⏱️  本轮耗时: {duration//60:02d}:{duration%60:02d}")
+    report_makespan(durations, time.time() - start_time, THREAD_COUNT)
+    report_wait_stats()
+    memory_governor.report()
     print(f"📁 文件位置: {OUTPUT_DIR}/")
     
     # 如果还有未完成的，提示用户
-    if total_processed < len(all_urls):
-        remaining = len(all_urls) - total_processed
-        print(f"\n💡 还有 {remaining} 个URL待处理，可再次运行程序继续")
+    if not stream_stats['exhausted']:
+        print(f"\n💡 CSV中还有未处理的URL，可再次运行程序继续")
     else:
-        print(f"\n🏆 所有 {len(all_urls)} 个景点都已处理完成！")
+        print(f"\n🏆 CSV中所有景点都已处理完成！")
+        if SINCE_LAST:
+            finish_refresh_pass()
 
 if __name__ == "__main__":
     try: